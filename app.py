@@ -1,16 +1,24 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, make_response, Response
 from timeclock import clock, DEFAULT_WORK_START, DEFAULT_WORK_END, get_pending_corrections_for_user
-from timesheet import get_monthly_report, get_worked_hours
+from timesheet import get_worked_hours, get_daily_seconds, get_flexitime_balance
 from zfa_utils import (
     load_userlist,
     load_timestamps,
     get_pending_corrections_flag,
     set_pending_corrections_flag,
+    get_data_version,
+    get_user_data_version,
+    local_cache,
+    seconds_to_hours_minutes_str,
 )
 from user_management import add_user, remove_user, update_user
-from datetime import datetime, timedelta
+from presence import get_presence, rebuild_presence_index, presence_stamp
+from error_log import query_errors
+from timeline import get_events_page, DEFAULT_LIMIT
+from rollup import get_rollup, LEVELS
+from datetime import datetime, timedelta, timezone, time as dt_time
 from calendar import monthrange
-import os, json
+import os, json, hashlib, time
 
 # ==========================================================
 # FLASK BASIS
@@ -19,6 +27,54 @@ app = Flask(__name__)
 app.secret_key = "zeiterfassung_secret_key"
 SESSION_TIMEOUT = 300  # Sekunden (Inaktivität = 5 Minuten)
 
+# ==========================================================
+# BEDINGTE GET-ANFRAGEN UND SEITEN-CACHE
+# ==========================================================
+RENDER_CACHE_MAX_ENTRIES = 2000
+_render_cache = {}  # cache_key -> (etag, gerenderter Inhalt)
+
+
+def _versioned_response(cache_key: tuple, stamps: list, render, day=None, mimetype: str = "text/html"):
+    """
+    Beantwortet eine Seite anhand der Datenversionen aus zfa_utils.
+    stamps: Liste von (Version, Änderungszeitpunkt ns), von denen die Seite abhängt.
+    day: Datum, auf das sich die Seite bezieht ("heute", "diese Woche" ...).
+
+    Stimmt If-None-Match / If-Modified-Since, wird 304 ohne Neuberechnung
+    geliefert. Sonst wird der Inhalt pro ETag im Speicher gehalten und nur
+    bei geänderten Daten neu gerendert.
+    """
+    etag = hashlib.sha1(repr((cache_key, stamps, str(day))).encode("utf-8")).hexdigest()
+
+    modified_ns = max((ns for _, ns in stamps), default=0)
+    last_modified = datetime.fromtimestamp(modified_ns / 1e9, timezone.utc).replace(microsecond=0)
+    if day is not None:
+        midnight = datetime.combine(day, dt_time.min).astimezone(timezone.utc)
+        last_modified = max(last_modified, midnight)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and last_modified <= since
+
+    if not_modified:
+        response = make_response("", 304)
+    else:
+        cached = _render_cache.get(cache_key)
+        if cached is None or cached[0] != etag:
+            if len(_render_cache) >= RENDER_CACHE_MAX_ENTRIES:
+                _render_cache.clear()
+            cached = (etag, render())
+            _render_cache[cache_key] = cached
+        response = make_response(cached[1])
+        response.mimetype = mimetype
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
 # ==========================================================
 # ROOT → LOGIN
 # ==========================================================
@@ -81,32 +137,39 @@ def user_home():
     name = session.get("name", "Unbekannt")
 
     user_folder = f"user_{user_id}"
-    timestamps_path = os.path.join(user_folder, f"{user_folder}_timestamps.txt")
-    timestamps = load_timestamps(timestamps_path)
-
     today = datetime.now().date()
-    today_str = today.strftime("%Y-%m-%d")
-    today_entries = [ts for ts in timestamps if ts["time"].startswith(today_str)]
 
-    # Arbeitszeiten berechnen
-    today_hours = get_worked_hours(user_id, today_str, today_str)["total_hm"]
-    monday = today - timedelta(days=today.weekday())
-    sunday = monday + timedelta(days=6)
-    week_hours = get_worked_hours(user_id, monday.strftime("%Y-%m-%d"), sunday.strftime("%Y-%m-%d"))["total_hm"]
-
-    year, month = today.year, today.month
-    last_day = monthrange(year, month)[1]
-    month_hours = get_worked_hours(user_id, f"{year}-{month:02d}-01", f"{year}-{month:02d}-{last_day:02d}")["total_hm"]
-
-    return render_template(
-        "user_home.html",
-        name=name,
-        user_id=user_id,
-        timestamps=today_entries,
-        today_hours=today_hours,
-        week_hours=week_hours,
-        month_hours=month_hours
-    )
+    def render():
+        timestamps_path = os.path.join(user_folder, f"{user_folder}_timestamps.txt")
+        timestamps = load_timestamps(timestamps_path)
+
+        today_str = today.strftime("%Y-%m-%d")
+        today_entries = [ts for ts in timestamps if ts["time"].startswith(today_str)]
+
+        # Arbeitszeiten berechnen
+        today_hours = get_worked_hours(user_id, today_str, today_str)["total_hm"]
+        monday = today - timedelta(days=today.weekday())
+        sunday = monday + timedelta(days=6)
+        week_hours = get_worked_hours(user_id, monday.strftime("%Y-%m-%d"), sunday.strftime("%Y-%m-%d"))["total_hm"]
+
+        year, month = today.year, today.month
+        last_day = monthrange(year, month)[1]
+        month_hours = get_worked_hours(user_id, f"{year}-{month:02d}-01", f"{year}-{month:02d}-{last_day:02d}")["total_hm"]
+        balance = get_flexitime_balance(user_id).get("balance_hm", "0h 0m")
+
+        return render_template(
+            "user_home.html",
+            name=name,
+            user_id=user_id,
+            timestamps=today_entries,
+            today_hours=today_hours,
+            week_hours=week_hours,
+            month_hours=month_hours,
+            balance=balance
+        )
+
+    stamps = [get_data_version("userlist"), get_user_data_version(user_folder)]
+    return _versioned_response(("user_home", user_id, name), stamps, render, day=today)
 
 # ==========================================================
 # ADMINBEREICH – HAUPTÜBERSICHT
@@ -121,20 +184,26 @@ def admin_panel():
     if "user_id" not in session or session.get("role") != "admin":
         return redirect(url_for("login"))
 
-    userlist = load_userlist()
+    # Benutzerliste und Monatsreport werden seitenweise per JavaScript
+    # über /api/admin/users und /api/admin/report nachgeladen.
     now = datetime.now()
-    year, month = now.year, now.month
-    report = get_monthly_report(year, month)
-    has_pending_corrections = get_pending_corrections_flag()
+    name = session.get("name", "Admin")
+    admin_id = session["user_id"]
 
-    return render_template(
-        "admin_panel.html",
-        name=session.get("name", "Admin"),
-        users=userlist,
-        report=report,
-        has_pending_corrections=has_pending_corrections,
-        admin_id=session["user_id"]  # Für An-/Abmeldebutton im Adminpanel
-    )
+    def render():
+        has_pending_corrections = get_pending_corrections_flag()
+
+        return render_template(
+            "admin_panel.html",
+            name=name,
+            report_year=now.year,
+            report_month=now.month,
+            has_pending_corrections=has_pending_corrections,
+            admin_id=admin_id  # Für An-/Abmeldebutton im Adminpanel
+        )
+
+    stamps = [get_data_version("corrections")]
+    return _versioned_response(("admin_panel", admin_id, name), stamps, render, day=now.date())
 
 # ==========================================================
 # ADMINBEREICH – NUTZER ERSTELLEN / BEARBEITEN / LÖSCHEN
@@ -151,7 +220,10 @@ def admin_add_user():
         last_name=data.get("last_name"),
         nfc_code=data.get("nfc_code"),
         password=data.get("password"),
-        role=data.get("role", "user")
+        role=data.get("role", "user"),
+        team=data.get("team"),
+        cost_center=data.get("cost_center"),
+        site=data.get("site")
     )
     return redirect(url_for("admin_panel"))
 
@@ -173,11 +245,15 @@ def admin_edit_user(user_id):
         nfc_code = request.form.get("nfc_code")
         password = request.form.get("password")
         role = request.form.get("role")
+        team = request.form.get("team")
+        cost_center = request.form.get("cost_center")
+        site = request.form.get("site")
         if not password:
             password = None
 
         update_user(user_id, first_name=first_name, last_name=last_name,
-                    nfc_code=nfc_code, password=password, role=role)
+                    nfc_code=nfc_code, password=password, role=role,
+                    team=team, cost_center=cost_center, site=site)
         return redirect(url_for("admin_panel"))
 
     return render_template("edit_user.html", user_id=user_id, user=user)
@@ -210,31 +286,38 @@ def admin_view_user(user_id):
 
     name = f"{user['first_name']} {user['last_name']}"
     user_folder = user["folder"]
-    timestamps_path = os.path.join(user_folder, f"{user['folder']}_timestamps.txt")
-    timestamps = load_timestamps(timestamps_path)
-
     today = datetime.now().date()
-    today_str = today.strftime("%Y-%m-%d")
-    today_entries = [ts for ts in timestamps if ts["time"].startswith(today_str)]
-
-    monday = today - timedelta(days=today.weekday())
-    sunday = monday + timedelta(days=6)
-    year, month = today.year, today.month
-    last_day = monthrange(year, month)[1]
-
-    today_hours = get_worked_hours(user_id, today_str, today_str)["total_hm"]
-    week_hours = get_worked_hours(user_id, monday.strftime("%Y-%m-%d"), sunday.strftime("%Y-%m-%d"))["total_hm"]
-    month_hours = get_worked_hours(user_id, f"{year}-{month:02d}-01", f"{year}-{month:02d}-{last_day:02d}")["total_hm"]
 
-    return render_template(
-        "user_home.html",
-        name=f"{name} (Admin-Ansicht)",
-        user_id=user_id,
-        timestamps=today_entries,
-        today_hours=today_hours,
-        week_hours=week_hours,
-        month_hours=month_hours
-    )
+    def render():
+        timestamps_path = os.path.join(user_folder, f"{user['folder']}_timestamps.txt")
+        timestamps = load_timestamps(timestamps_path)
+
+        today_str = today.strftime("%Y-%m-%d")
+        today_entries = [ts for ts in timestamps if ts["time"].startswith(today_str)]
+
+        monday = today - timedelta(days=today.weekday())
+        sunday = monday + timedelta(days=6)
+        year, month = today.year, today.month
+        last_day = monthrange(year, month)[1]
+
+        today_hours = get_worked_hours(user_id, today_str, today_str)["total_hm"]
+        week_hours = get_worked_hours(user_id, monday.strftime("%Y-%m-%d"), sunday.strftime("%Y-%m-%d"))["total_hm"]
+        month_hours = get_worked_hours(user_id, f"{year}-{month:02d}-01", f"{year}-{month:02d}-{last_day:02d}")["total_hm"]
+        balance = get_flexitime_balance(user_id).get("balance_hm", "0h 0m")
+
+        return render_template(
+            "user_home.html",
+            name=f"{name} (Admin-Ansicht)",
+            user_id=user_id,
+            timestamps=today_entries,
+            today_hours=today_hours,
+            week_hours=week_hours,
+            month_hours=month_hours,
+            balance=balance
+        )
+
+    stamps = [get_data_version("userlist"), get_user_data_version(user_folder)]
+    return _versioned_response(("admin_view_user", user_id), stamps, render, day=today)
 
 # ==========================================================
 # ADMINBEREICH – FEHLERZEITEN / AUTO-KORREKTUREN
@@ -268,6 +351,36 @@ def fix_errors():
         end_h=f"{DEFAULT_WORK_END[0]:02d}:{DEFAULT_WORK_END[1]:02d}"
     )
 
+# ==========================================================
+# ADMINBEREICH – FEHLERPROTOKOLL
+# ==========================================================
+@app.route("/admin/errors")
+def admin_errors():
+    """
+    Zeigt das Fehlerprotokoll, gefiltert nach Nutzer und Zeitraum.
+    Parameter: user (User-ID), from / to (YYYY-MM-DD).
+    """
+    if "role" not in session or session.get("role") != "admin":
+        return redirect(url_for("login"))
+
+    user_filter = request.args.get("user", "").strip()
+    date_from = request.args.get("from", "").strip()
+    date_to = request.args.get("to", "").strip()
+
+    errors = query_errors(
+        user_id=user_filter or None,
+        date_from=date_from or None,
+        date_to=date_to or None,
+    )
+
+    return render_template(
+        "errors.html",
+        errors=errors,
+        user_filter=user_filter,
+        date_from=date_from,
+        date_to=date_to
+    )
+
 # ==========================================================
 # API: AN-/ABMELDUNG
 # ==========================================================
@@ -285,8 +398,232 @@ def api_clock():
     message = clock(user_id)
     return jsonify({"message": message}), 200
 
+# ==========================================================
+# API: ADMINBEREICH – BENUTZERLISTE UND MONATSREPORT (SEITENWEISE)
+# ==========================================================
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 200
+
+
+def _admin_user_rows(q: str, sort: str) -> list[dict]:
+    """
+    Filtert die Benutzerliste nach Suchbegriff (ID oder Name) und sortiert sie.
+    sort: "id", "name" oder "role", mit "-" davor absteigend.
+    Das Ergebnis wird pro Worker bis zur nächsten Datenänderung zwischengespeichert.
+    """
+    return local_cache(("admin_user_rows", q, sort), lambda: _build_admin_user_rows(q, sort))
+
+
+def _build_admin_user_rows(q: str, sort: str) -> list[dict]:
+    userlist = load_userlist()
+    q = (q or "").strip().lower()
+
+    rows = []
+    for uid, user in userlist.items():
+        name = f"{user['first_name']} {user['last_name']}"
+        if q and q not in name.lower() and q != uid.lower():
+            continue
+        rows.append({"user_id": uid, "name": name, "role": user.get("role", "user")})
+
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field == "name":
+        key = lambda r: r["name"].lower()
+    elif field == "role":
+        key = lambda r: (r["role"], r["name"].lower())
+    else:
+        key = lambda r: (0, int(r["user_id"]), "") if r["user_id"].isdigit() else (1, 0, r["user_id"])
+    rows.sort(key=key, reverse=descending)
+    return rows
+
+
+def _paginate(rows: list, page: int, per_page: int) -> tuple[list, dict]:
+    """Schneidet eine Seite aus der Liste und liefert die Metadaten dazu."""
+    per_page = max(1, min(per_page, ADMIN_MAX_PAGE_SIZE))
+    total = len(rows)
+    pages = max(1, -(-total // per_page))
+    page = max(1, min(page, pages))
+    start = (page - 1) * per_page
+    meta = {"page": page, "per_page": per_page, "total": total, "pages": pages}
+    return rows[start:start + per_page], meta
+
+
+@app.route("/api/admin/users")
+def api_admin_users():
+    """
+    Liefert die Benutzerliste seitenweise als JSON.
+    Parameter: page, per_page, q (Suche nach ID/Name), sort (id|name|role, "-" = absteigend).
+    """
+    if session.get("role") != "admin":
+        return jsonify({"error": "Nicht berechtigt"}), 403
+
+    rows = _admin_user_rows(request.args.get("q", ""), request.args.get("sort", "id"))
+    page_rows, meta = _paginate(
+        rows,
+        request.args.get("page", 1, type=int),
+        request.args.get("per_page", ADMIN_PAGE_SIZE, type=int),
+    )
+    return jsonify({**meta, "users": page_rows}), 200
+
+
+@app.route("/api/admin/report")
+def api_admin_report():
+    """
+    Liefert den Monatsreport seitenweise als JSON. Die Arbeitsstunden werden
+    nur für die Nutzer der angeforderten Seite berechnet.
+    Parameter: year, month, page, per_page, q, sort (wie /api/admin/users).
+    """
+    if session.get("role") != "admin":
+        return jsonify({"error": "Nicht berechtigt"}), 403
+
+    now = datetime.now()
+    year = request.args.get("year", now.year, type=int)
+    month = request.args.get("month", now.month, type=int)
+    if not 1 <= year <= 9999:
+        return jsonify({"error": "Ungültiges Jahr"}), 400
+    if not 1 <= month <= 12:
+        return jsonify({"error": "Ungültiger Monat"}), 400
+
+    rows = _admin_user_rows(request.args.get("q", ""), request.args.get("sort", "id"))
+    page_rows, meta = _paginate(
+        rows,
+        request.args.get("page", 1, type=int),
+        request.args.get("per_page", ADMIN_PAGE_SIZE, type=int),
+    )
+
+    start_date = f"{year}-{month:02d}-01"
+    last_day = monthrange(year, month)[1]
+    end_date = f"{year}-{month:02d}-{last_day:02d}"
+
+    def render():
+        # userlist.txt nur einmal laden, nicht pro Zeile über get_worked_hours()
+        userlist = load_userlist()
+        users = []
+        for row in page_rows:
+            user = userlist.get(row["user_id"])
+            total_seconds = sum(get_daily_seconds(user["folder"], start_date, end_date).values()) if user else 0
+            users.append({**row,
+                          "total_hours": round(total_seconds / 3600, 2),
+                          "total_hm": seconds_to_hours_minutes_str(total_seconds)})
+        return json.dumps({**meta, "year": year, "month": month, "users": users}, ensure_ascii=False)
+
+    # Hängt von allen Zeitdaten ab → globale Datenversion
+    stamps = [get_data_version("global")]
+    return _versioned_response(("api_admin_report", request.full_path), stamps, render,
+                               mimetype="application/json")
+
+@app.route("/api/admin/rollup")
+def api_admin_rollup():
+    """
+    Liefert Monatssummen je Standort / Kostenstelle / Team.
+    Parameter: year, month, level (z. B. "site", "site/cost_center", "site/cost_center/team").
+    """
+    if session.get("role") != "admin":
+        return jsonify({"error": "Nicht berechtigt"}), 403
+
+    now = datetime.now()
+    year = request.args.get("year", now.year, type=int)
+    month = request.args.get("month", now.month, type=int)
+    level = request.args.get("level", LEVELS[0])
+    if not 1 <= year <= 9999:
+        return jsonify({"error": "Ungültiges Jahr"}), 400
+    if not 1 <= month <= 12 or level not in LEVELS:
+        return jsonify({"error": "Ungültiger Monat oder Ebene"}), 400
+
+    return jsonify(get_rollup(year, month, level)), 200
+
+# ==========================================================
+# API: BUCHUNGSVERLAUF EINES NUTZERS (CURSOR-BASIERT)
+# ==========================================================
+@app.route("/api/users/<user_id>/events")
+def api_user_events(user_id):
+    """
+    Liefert die Buchungen eines Nutzers seitenweise.
+    Parameter: from / to (YYYY-MM-DD), cursor (next_cursor der Vorseite), limit.
+    Erlaubt für Administratoren und für den Nutzer selbst.
+    """
+    if session.get("role") != "admin" and session.get("user_id") != user_id:
+        return jsonify({"error": "Nicht berechtigt"}), 403
+
+    result = get_events_page(
+        user_id,
+        date_from=request.args.get("from") or None,
+        date_to=request.args.get("to") or None,
+        cursor=request.args.get("cursor") or None,
+        limit=request.args.get("limit", DEFAULT_LIMIT, type=int),
+    )
+    if "error" in result:
+        return jsonify(result), 404
+    return jsonify(result), 200
+
+# ==========================================================
+# API: ANWESENHEIT ("Wer ist gerade da?")
+# ==========================================================
+PRESENCE_POLL_SECONDS = 1
+PRESENCE_KEEPALIVE_SECONDS = 15
+PRESENCE_STREAM_SECONDS = 55        # danach endet der Stream, der Browser verbindet neu
+PRESENCE_RECONNECT_MS = 2000
+_presence_cache = {"stamp": None, "data": None}
+
+
+def _current_presence() -> dict:
+    """
+    Liefert den Anwesenheitsstatus aus dem Speicher. Neu geladen wird nur,
+    wenn sich presence.json selbst, die Benutzerliste oder das Datum geändert
+    haben. (Die Zeitdaten-Version reicht nicht: clock() speichert die
+    Buchung vor dem Anwesenheitsindex.)
+    """
+    stamp = (presence_stamp(), get_data_version("userlist"), datetime.now().date())
+    if _presence_cache["stamp"] != stamp:
+        _presence_cache["data"] = get_presence()
+        _presence_cache["stamp"] = stamp
+    return _presence_cache["data"]
+
+
+@app.route("/api/presence")
+def api_presence():
+    """Liefert alle Nutzer mit Anwesenheitsstatus (z. B. für Evakuierungslisten)."""
+    if session.get("role") != "admin":
+        return jsonify({"error": "Nicht berechtigt"}), 403
+    return jsonify(_current_presence()), 200
+
+
+@app.route("/api/presence/stream")
+def api_presence_stream():
+    """
+    Server-Sent Events: sendet den Anwesenheitsstatus bei jeder Änderung.
+    Jede Verbindung endet nach PRESENCE_STREAM_SECONDS, damit offene
+    Admin-Tabs keinen Server-Thread dauerhaft belegen; EventSource verbindet
+    sich nach PRESENCE_RECONNECT_MS automatisch neu.
+    """
+    if session.get("role") != "admin":
+        return jsonify({"error": "Nicht berechtigt"}), 403
+
+    def stream():
+        last_stamp = None
+        idle_seconds = 0
+        yield f"retry: {PRESENCE_RECONNECT_MS}\n\n"
+        deadline = time.monotonic() + PRESENCE_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            data = _current_presence()
+            if _presence_cache["stamp"] != last_stamp:
+                last_stamp = _presence_cache["stamp"]
+                idle_seconds = 0
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            elif idle_seconds >= PRESENCE_KEEPALIVE_SECONDS:
+                idle_seconds = 0
+                yield ": keepalive\n\n"
+            time.sleep(PRESENCE_POLL_SECONDS)
+            idle_seconds += PRESENCE_POLL_SECONDS
+
+    response = Response(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 # ==========================================================
 # SERVERSTART
 # ==========================================================
 if __name__ == "__main__":
+    rebuild_presence_index()
     app.run(host="0.0.0.0", port=8080, debug=True)
@@ -0,0 +1,119 @@
+"""
+Verschiebt abgeschlossene Jahre aus user_X_timestamps.txt in komprimierte
+Archive (user_X/archive/user_X_<Jahr>.jsonl.gz) samt Jahreszusammenfassung
+mit Tagessummen. get_worked_hours() liest für archivierte Jahre nur noch
+die Zusammenfassung.
+
+    python archive.py              # alle Jahre vor dem laufenden Jahr
+    python archive.py --year 2024  # alle Jahre bis einschließlich 2024
+"""
+
+import os
+import gzip
+import json
+import argparse
+from datetime import datetime
+from zfa_utils import (
+    load_userlist,
+    load_timestamps,
+    save_timestamps,
+    archive_dir,
+    archive_events_path,
+    archive_summary_path,
+    iter_archived_events,
+    timestamps_lock,
+    bump_user_data_version,
+)
+from timesheet import daily_worked_seconds
+
+# ==========================================================
+# JAHRESARCHIVIERUNG
+# ==========================================================
+def _write_atomic(path: str, data: bytes) -> None:
+    """Schreibt erst in eine temporäre Datei und ersetzt dann das Ziel."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_year_archive(user_folder: str, year: int, events: list) -> None:
+    """Schreibt Buchungen und Zusammenfassung eines Jahres (mit vorhandenem Archiv zusammengeführt)."""
+    merged = {(e["type"], e["time"]): e for e in iter_archived_events(user_folder, year)}
+    merged.update({(e["type"], e["time"]): e for e in events})
+    all_events = sorted(merged.values(), key=lambda e: e["time"])
+
+    lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in all_events)
+    daily = {day: round(sec) for day, sec in sorted(daily_worked_seconds(all_events).items())}
+    summary = {
+        "year": year,
+        "events": len(all_events),
+        "first": all_events[0]["time"],
+        "last": all_events[-1]["time"],
+        "total_seconds": sum(daily.values()),
+        "daily": daily,
+    }
+
+    os.makedirs(archive_dir(user_folder), exist_ok=True)
+    # Erst Archiv, dann Zusammenfassung: get_worked_hours() nutzt nur die Zusammenfassung
+    _write_atomic(archive_events_path(user_folder, year), gzip.compress(lines.encode("utf-8")))
+    _write_atomic(archive_summary_path(user_folder, year),
+                  json.dumps(summary, indent=4, ensure_ascii=False).encode("utf-8"))
+    # Caches (Report, Roll-up) hängen an der Datenversion
+    bump_user_data_version(user_folder)
+
+
+def archive_user(user_id: str, up_to_year: int) -> str:
+    """Archiviert alle Jahre eines Nutzers bis einschließlich up_to_year."""
+    userlist = load_userlist()
+    if user_id not in userlist:
+        return f"Unbekannte User-ID {user_id}"
+
+    user_folder = userlist[user_id]["folder"]
+    timestamps_path = os.path.join(user_folder, f"{user_folder}_timestamps.txt")
+    # Sperre bis nach dem Zurückschreiben: sonst gingen Buchungen verloren, die
+    # zwischen Laden und Speichern eintreffen
+    with timestamps_lock(timestamps_path):
+        timestamps = load_timestamps(timestamps_path)
+
+        cutoff = f"{up_to_year + 1}-01-01"
+        split = 0
+        while split < len(timestamps) and timestamps[split]["time"] < cutoff:
+            split += 1
+        # Eine offene Anmeldung am Jahresende bleibt mit ihrer Abmeldung im aktiven Bestand
+        if split and timestamps[split - 1]["type"] == "in":
+            split -= 1
+        if split == 0:
+            return f"Nutzer {user_id}: nichts zu archivieren."
+
+        by_year = {}
+        for entry in timestamps[:split]:
+            by_year.setdefault(int(entry["time"][:4]), []).append(entry)
+
+        for year, events in sorted(by_year.items()):
+            write_year_archive(user_folder, year, events)
+
+        save_timestamps(timestamps_path, timestamps[split:])
+
+    years = ", ".join(str(y) for y in sorted(by_year))
+    return f"Nutzer {user_id}: {split} Einträge archiviert ({years}), {len(timestamps) - split} verbleiben."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiviert abgeschlossene Jahre aller Nutzer.")
+    parser.add_argument("--year", type=int, default=datetime.now().year - 1,
+                        help="letztes zu archivierendes Jahr (Standard: Vorjahr)")
+    args = parser.parse_args()
+
+    if args.year >= datetime.now().year:
+        print("❌ Das laufende Jahr kann nicht archiviert werden.")
+        return
+
+    for user_id in load_userlist().keys():
+        print(archive_user(user_id, args.year))
+
+    print(f"✅ Archivierung bis {args.year} abgeschlossen.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,110 @@
+import argparse
+import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from timesheet import export_monthly_report_json
+from timesheet import export_monthly_report_json, update_monthly_report_json
+from zfa_utils import (
+    load_userlist,
+    load_timestamps,
+    load_dirty_months,
+    clear_dirty_months,
+    mark_dirty_many,
+    archived_years,
+    load_archive_summary,
+)
+from snapshot import read_snapshot
+
+
+def _first_recorded_month() -> str | None:
+    """
+    Liefert den frühesten Monat ("YYYY-MM"), in dem ein Nutzer eine Buchung hat.
+    Archivierte Jahre (siehe archive.py) zählen mit.
+    """
+    first = None
+    for user_data in load_userlist().values():
+        folder = user_data["folder"]
+        years = archived_years(folder)
+        if years:
+            month_key = load_archive_summary(folder, years[0])["first"][:7]
+        else:
+            timestamps = load_timestamps(os.path.join(folder, f"{folder}_timestamps.txt"))
+            month_key = timestamps[0]["time"][:7] if timestamps else None
+        if month_key and (first is None or month_key < first):
+            first = month_key
+    return first
+
+
+def _months_between(first: str, last: str) -> list[str]:
+    """Alle Monate von first bis einschließlich last im Format "YYYY-MM"."""
+    year, month = int(first[:4]), int(first[5:7])
+    months = []
+    while f"{year}-{month:02d}" <= last:
+        months.append(f"{year}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+@contextmanager
+def _claimed(claimed: dict):
+    """
+    Nimmt die zu exportierenden (Monat, Nutzer)-Paare vor dem Snapshot aus der
+    Änderungsliste. Buchungen während des Exports werden so erneut vorgemerkt;
+    schlägt der Export fehl, werden die Paare zurückgelegt.
+    """
+    clear_dirty_months(claimed)
+    try:
+        yield
+    except BaseException:
+        # mark_dirty_many() erwartet {user_id: [Monate]}
+        by_user = {}
+        for month_key, user_ids in claimed.items():
+            for user_id in user_ids:
+                by_user.setdefault(user_id, []).append(month_key)
+        mark_dirty_many(by_user)
+        raise
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Exportiert Monatsreports (standardmäßig nur geänderte Monate).")
+    parser.add_argument("--all", action="store_true",
+                        help="alle abgeschlossenen Monate seit der ersten Buchung neu erstellen")
+    parser.add_argument("--since", metavar="YYYY-MM",
+                        help="alle abgeschlossenen Monate ab diesem Monat neu erstellen")
+    args = parser.parse_args()
+
     today = datetime.now()
     last_month_date = today.replace(day=1) - timedelta(days=1)
+    last_closed = last_month_date.strftime("%Y-%m")
 
-    year = last_month_date.year
-    month = last_month_date.month
+    dirty = load_dirty_months()
 
-    result = export_monthly_report_json(year, month)
-    month_name = last_month_date.strftime("%B")
+    # Vollständiger Neuaufbau
+    if args.all or args.since:
+        first = args.since if args.since else _first_recorded_month()
+        months = _months_between(first, last_closed) if first else []
+        claimed = {m: dirty[m] for m in months if m in dirty}
+        with _claimed(claimed), read_snapshot():
+            for month_key in months:
+                print(export_monthly_report_json(int(month_key[:4]), int(month_key[5:7])))
+        print(f"✅ Vollständiger Export von {len(months)} Monat(en) erfolgreich!")
+        return
 
-    print(f"✅ Export für {month_name} {year} erfolgreich!")
-    print(result)
+    # Inkrementeller Export: nur abgeschlossene Monate mit Änderungen
+    # (laufender Monat wird erst nach Monatsende exportiert)
+    claimed = {m: users for m, users in dirty.items() if m <= last_closed}
+    with _claimed(claimed), read_snapshot():
+        for month_key in sorted(claimed.keys()):
+            user_ids = claimed[month_key]
+            print(update_monthly_report_json(int(month_key[:4]), int(month_key[5:7]), user_ids))
+
+        # Vormonat immer sicherstellen, auch ohne Änderungen
+        if last_closed not in claimed:
+            year, month = last_month_date.year, last_month_date.month
+            print(update_monthly_report_json(year, month, []))
+
+    month_name = last_month_date.strftime("%B")
+    print(f"✅ Export für {month_name} {last_month_date.year} erfolgreich! "
+          f"({len(claimed) + (last_closed not in claimed)} Monat(e) geprüft)")
 
 if __name__ == "__main__":
     main()
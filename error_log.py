@@ -0,0 +1,268 @@
+import os
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime
+from zfa_utils import write_json_atomic
+
+try:
+    import fcntl  # nur unter Linux/Unix (Raspberry Pi, Server)
+except ImportError:
+    fcntl = None
+
+# ==========================================================
+# KONSTANTEN – Ablage und Rotation
+# ==========================================================
+LOG_DIR = "logs"
+ERROR_LOG_FILE = os.path.join(LOG_DIR, "error_log.jsonl")
+ERROR_LOG_INDEX = os.path.join(LOG_DIR, "error_log_index.json")
+ERROR_LOG_LOCK = os.path.join(LOG_DIR, "error_log.lock")
+MAX_LOG_BYTES = 5 * 1024 * 1024   # Rotation ab 5 MB ...
+MAX_ROTATED_FILES = 24            # ... oder bei Monatswechsel; ältere Dateien werden gelöscht
+BATCH_SIZE = 100                  # max. Einträge pro Schreibvorgang
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+# ==========================================================
+# INDEX (pro Datei: Offset des ersten Eintrags je Tag, auch je Nutzer)
+# ==========================================================
+def _load_index() -> dict:
+    """
+    Lädt den Offset-Index.
+
+    Rückgabeformat:
+    {"files": [{"file": "error_log-20251031-235959.jsonl",
+                "days": {"2025-10-30": 0, "2025-10-31": 4711},
+                "users": {"3": {"2025-10-30": 0, "2025-10-31": 5120}}}, ...]}
+    Die aktuelle Datei steht immer als letzter Eintrag in der Liste.
+    Dateien aus älteren Versionen haben keinen "users"-Eintrag und werden
+    bei Nutzerabfragen vollständig gelesen. Bei Nutzerabfragen werden nur die
+    Tage gelesen, an denen der Nutzer Einträge hat.
+    """
+    if not os.path.exists(ERROR_LOG_INDEX):
+        return {"files": []}
+    try:
+        with open(ERROR_LOG_INDEX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {"files": []}
+
+
+def _save_index(index: dict) -> None:
+    # Atomar, da query_errors() ohne Sperre liest
+    write_json_atomic(ERROR_LOG_INDEX, index)
+
+
+def _current_file_entry(index: dict) -> dict:
+    """Indexeintrag der aktuellen Logdatei (wird bei Bedarf angelegt)."""
+    current = os.path.basename(ERROR_LOG_FILE)
+    if not index["files"] or index["files"][-1]["file"] != current:
+        index["files"].append({"file": current, "days": {}, "users": {}})
+    return index["files"][-1]
+
+
+# ==========================================================
+# ROTATION
+# ==========================================================
+def _rotate_if_needed(index: dict, first_day: str) -> None:
+    """Benennt die aktuelle Datei um, wenn sie zu groß ist oder ein neuer Monat beginnt."""
+    if not os.path.exists(ERROR_LOG_FILE):
+        return
+    entry = _current_file_entry(index)
+    days = sorted(entry["days"])
+    too_big = os.path.getsize(ERROR_LOG_FILE) >= MAX_LOG_BYTES
+    new_month = bool(days) and days[0][:7] != first_day[:7]
+    if not (too_big or new_month):
+        return
+
+    rotated = f"error_log-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.jsonl"
+    os.replace(ERROR_LOG_FILE, os.path.join(LOG_DIR, rotated))
+    entry["file"] = rotated
+
+    # Älteste Dateien entfernen
+    while len(index["files"]) > MAX_ROTATED_FILES:
+        old = index["files"].pop(0)
+        old_path = os.path.join(LOG_DIR, old["file"])
+        if os.path.exists(old_path):
+            os.remove(old_path)
+
+
+# ==========================================================
+# HINTERGRUND-SCHREIBER
+# ==========================================================
+def _write_batch(events: list[dict]) -> None:
+    """Schreibt mehrere Einträge in einem Vorgang und pflegt Rotation und Index."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    with open(ERROR_LOG_LOCK, "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            index = _load_index()
+            _rotate_if_needed(index, events[0]["time"][:10])
+            entry = _current_file_entry(index)
+
+            with open(ERROR_LOG_FILE, "ab") as f:
+                for event in events:
+                    day = event["time"][:10]
+                    if day not in entry["days"]:
+                        entry["days"][day] = f.tell()
+                    if "users" in entry:
+                        entry["users"].setdefault(str(event["user_id"]), {}).setdefault(day, f.tell())
+                    f.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+
+            _save_index(index)
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _writer_loop() -> None:
+    stop = False
+    while not stop:
+        event = _queue.get()
+        if event is None:
+            return
+        batch = [event]
+        while len(batch) < BATCH_SIZE:
+            try:
+                event = _queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is None:
+                stop = True
+                break
+            batch.append(event)
+        try:
+            _write_batch(batch)
+        except OSError as e:
+            print(f"❌ Fehlerprotokoll konnte nicht geschrieben werden: {e}")
+
+
+def _ensure_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="error-log-writer", daemon=True)
+            _writer.start()
+
+
+def flush() -> None:
+    """Schreibt alle wartenden Einträge und beendet den Hintergrund-Schreiber."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            return
+        _queue.put(None)
+        writer = _writer
+        _writer = None
+    writer.join(timeout=5)
+
+
+atexit.register(flush)
+
+
+# ==========================================================
+# LESEN
+# ==========================================================
+def _parse_line(line: bytes) -> dict | None:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return None  # unvollständige Zeile
+
+
+def _scan_lines(path: str, offset: int, user_id: str | None, date_to: str | None) -> list[dict]:
+    """Liest eine Logdatei ab offset bis zum Ende des Zeitraums."""
+    found = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            event = _parse_line(line)
+            if event is None:
+                continue
+            if date_to and event.get("time", "")[:10] > date_to:
+                break
+            if user_id and event.get("user_id") != user_id:
+                continue
+            found.append(event)
+    return found
+
+
+def _read_user_days(path: str, user_days: dict, user_id: str,
+                    date_from: str | None, date_to: str | None) -> list[dict]:
+    """
+    Liest nur die Tage, an denen der Nutzer Einträge hat, jeweils ab seinem
+    ersten Eintrag des Tages (Offsets aus dem Index).
+    """
+    found = []
+    days = [d for d in sorted(user_days)
+            if (not date_from or d >= date_from) and (not date_to or d <= date_to)]
+    if not days:
+        return found
+    with open(path, "rb") as f:
+        for day in days:
+            f.seek(user_days[day])
+            for line in f:
+                event = _parse_line(line)
+                if event is None:
+                    continue
+                if event.get("time", "")[:10] != day:
+                    break
+                if event.get("user_id") == user_id:
+                    found.append(event)
+    return found
+
+
+# ==========================================================
+# ÖFFENTLICHE FUNKTIONEN
+# ==========================================================
+def log_event(user_id: str, user_name: str, message: str, level: str = "error") -> None:
+    """Reiht einen Eintrag zum Schreiben ein (kehrt sofort zurück)."""
+    _queue.put({
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "level": level,
+        "user_id": user_id,
+        "user_name": user_name,
+        "message": message,
+    })
+    _ensure_writer()
+
+
+def query_errors(user_id: str = None, date_from: str = None, date_to: str = None,
+                 limit: int = 500) -> list[dict]:
+    """
+    Liefert Einträge für einen Nutzer und/oder Zeitraum ("YYYY-MM-DD"), neueste zuerst.
+    Über den Tagesindex werden nur die betroffenen Dateien ab dem
+    passenden Offset gelesen; bei Nutzerabfragen nur die Tage des Nutzers.
+    """
+    results = []
+    for entry in reversed(_load_index()["files"]):
+        days = sorted(entry["days"])
+        if not days:
+            continue
+        if date_from and days[-1] < date_from:
+            break  # ältere Dateien liegen noch weiter zurück
+        if date_to and days[0] > date_to:
+            continue
+
+        path = os.path.join(LOG_DIR, entry["file"])
+        if not os.path.exists(path):
+            continue
+        start_days = [d for d in days if not date_from or d >= date_from]
+        offset = entry["days"][start_days[0]] if start_days else 0
+
+        if user_id and "users" in entry:
+            file_results = _read_user_days(path, entry["users"].get(str(user_id), {}),
+                                           user_id, date_from, date_to)
+        else:
+            file_results = _scan_lines(path, offset, user_id, date_to)
+
+        results.extend(reversed(file_results))
+        if len(results) >= limit:
+            break
+
+    return results[:limit]
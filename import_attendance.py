@@ -0,0 +1,247 @@
+"""
+Importiert Buchungen der alten Kiosk-Software (attendancetxt.py) in die
+Nutzerordner.
+
+    python import_attendance.py                         # attendance.txt / mitarbeiter.txt
+    python import_attendance.py --attendance alt.txt --create-missing
+    python import_attendance.py --dry-run
+
+attendance.txt:  UID;Datum;CheckIn;CheckOut;DauerMinuten
+mitarbeiter.txt: UID;Name;Geburtsdatum;Startdatum
+
+Die UID wird über den NFC-Code der userlist.txt einem Nutzer zugeordnet.
+Buchungen in bereits archivierten Jahren (archive.py) werden in das
+Jahresarchiv samt Tagessummen übernommen, nicht in die aktive Datei.
+Die Zeilen werden zunächst nach Nutzer auf temporäre Teildateien verteilt,
+dann pro Teildatei mit dem Bestand zusammengeführt (ohne Duplikate) und je
+Nutzer genau einmal gespeichert. Der Speicherbedarf hängt damit von der
+Größe einer Teildatei ab, nicht von der Gesamtzahl der Zeilen.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import zlib
+from datetime import datetime
+from contextlib import nullcontext
+from zfa_utils import (
+    load_userlist,
+    load_timestamps,
+    save_timestamps,
+    mark_dirty_many,
+    archived_years,
+    iter_archived_events,
+    timestamps_lock,
+)
+from archive import write_year_archive
+from user_management import add_user
+from presence import rebuild_presence_index
+
+# ==========================================================
+# KONSTANTEN
+# ==========================================================
+ATTENDANCE_FILE = "attendance.txt"
+USERS_FILE = "mitarbeiter.txt"
+DEFAULT_BUCKETS = 64
+
+
+def normalize_uid(uid: str) -> str:
+    """Gleicht die Schreibweisen an (nfcpy: "04aabbcc", libnfc: "04 AA BB CC")."""
+    return uid.replace(" ", "").replace(":", "").strip().upper()
+
+
+def _nfc_index(userlist: dict) -> dict:
+    """Normalisierter NFC-Code → User-ID."""
+    return {normalize_uid(data["nfc_code"]): uid
+            for uid, data in userlist.items() if data.get("nfc_code")}
+
+
+def create_missing_users(users_file: str, nfc_to_user: dict) -> int:
+    """Legt Nutzer aus mitarbeiter.txt an, deren UID noch keinem Nutzer zugeordnet ist."""
+    if not os.path.exists(users_file):
+        return 0
+    created = 0
+    with open(users_file, "r", encoding="utf-8") as f:
+        next(f, None)  # Kopfzeile überspringen
+        for line in f:
+            data = line.rstrip("\n").split(";")
+            if len(data) < 2 or not data[0]:
+                continue
+            uid = normalize_uid(data[0])
+            if uid in nfc_to_user:
+                continue
+            first_name, _, last_name = data[1].strip().rpartition(" ")
+            if not first_name:
+                first_name, last_name = last_name, ""
+            add_user(first_name, last_name, nfc_code=uid)
+            created += 1
+    return created
+
+
+def _parse_row(line: str):
+    """Zerlegt eine attendance-Zeile in (UID, [(Typ, Zeit), ...]); None bei ungültigen Zeilen."""
+    data = line.rstrip("\n").split(";")
+    if len(data) < 3 or not data[0]:
+        return None
+    uid, datum, check_in = data[0], data[1], data[2]
+    check_out = data[3] if len(data) > 3 else ""
+    try:
+        datetime.strptime(f"{datum} {check_in}", "%Y-%m-%d %H:%M:%S")
+        if check_out:
+            datetime.strptime(f"{datum} {check_out}", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    events = [("in", f"{datum} {check_in}")]
+    if check_out:
+        events.append(("out", f"{datum} {check_out}"))
+    return uid, events
+
+
+# ==========================================================
+# IMPORT
+# ==========================================================
+def partition_rows(attendance_file: str, nfc_to_user: dict, tmp_dir: str, buckets: int) -> dict:
+    """
+    Erster Durchlauf: verteilt die Ereignisse zeilenweise auf Teildateien
+    (eine Zeile "user_id;typ;zeit" pro Ereignis).
+    """
+    stats = {"rows": 0, "invalid": 0, "unknown": 0, "unknown_uids": set()}
+    files = [open(os.path.join(tmp_dir, f"bucket_{i}.txt"), "w", encoding="utf-8") for i in range(buckets)]
+    try:
+        with open(attendance_file, "r", encoding="utf-8") as f:
+            next(f, None)  # Kopfzeile überspringen
+            for line in f:
+                stats["rows"] += 1
+                parsed = _parse_row(line)
+                if not parsed:
+                    stats["invalid"] += 1
+                    continue
+                uid, events = parsed
+                user_id = nfc_to_user.get(normalize_uid(uid))
+                if user_id is None:
+                    stats["unknown"] += 1
+                    stats["unknown_uids"].add(uid)
+                    continue
+                bucket = files[zlib.crc32(user_id.encode("utf-8")) % buckets]
+                for event_type, time_str in events:
+                    bucket.write(f"{user_id};{event_type};{time_str}\n")
+    finally:
+        for bucket in files:
+            bucket.close()
+    return stats
+
+
+def merge_bucket(path: str, userlist: dict, dry_run: bool) -> tuple[int, int, dict]:
+    """
+    Zweiter Durchlauf für eine Teildatei: pro Nutzer mit dem Bestand
+    zusammenführen und einmal speichern. Liefert (Nutzer, neue Einträge, geänderte Monate).
+    """
+    per_user = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            user_id, event_type, time_str = line.rstrip("\n").split(";")
+            per_user.setdefault(user_id, set()).add((event_type, time_str))
+
+    added = 0
+    changes = {}
+    for user_id, events in per_user.items():
+        folder = userlist[user_id]["folder"]
+        timestamps_path = os.path.join(folder, f"{folder}_timestamps.txt")
+        # Laden bis Speichern unter der Sperre, damit parallele Buchungen nicht verloren gehen
+        with (nullcontext() if dry_run else timestamps_lock(timestamps_path)):
+            timestamps = load_timestamps(timestamps_path)
+
+            new_events = events - {(e["type"], e["time"]) for e in timestamps}
+
+            # Buchungen in bereits archivierten Jahren gehören ins Jahresarchiv,
+            # sonst zählte get_worked_hours() sie doppelt (Zusammenfassung + aktive Datei)
+            for year in archived_years(folder):
+                year_events = {e for e in new_events if e[1].startswith(f"{year}-")}
+                if not year_events:
+                    continue
+                new_events -= year_events
+                year_events -= {(e["type"], e["time"]) for e in iter_archived_events(folder, year)}
+                if year_events and not dry_run:
+                    write_year_archive(folder, year, [{"type": t, "time": ts} for t, ts in year_events])
+                if year_events:
+                    added += len(year_events)
+                    changes.setdefault(user_id, set()).update(ts[:7] for _, ts in year_events)
+
+            if new_events:
+                timestamps.extend({"type": t, "time": ts} for t, ts in new_events)
+                timestamps.sort(key=lambda e: (e["time"], 0 if e["type"] == "out" else 1))
+                if not dry_run:
+                    os.makedirs(folder, exist_ok=True)
+                    save_timestamps(timestamps_path, timestamps)
+                added += len(new_events)
+                changes.setdefault(user_id, set()).update(ts[:7] for _, ts in new_events)
+
+    changes = {user_id: sorted(months) for user_id, months in changes.items()}
+    return len(changes), added, changes
+
+
+def import_attendance(attendance_file: str = ATTENDANCE_FILE, users_file: str = USERS_FILE,
+                      create_missing: bool = False, buckets: int = DEFAULT_BUCKETS,
+                      dry_run: bool = False) -> dict:
+    """Importiert attendance.txt vollständig und liefert eine Statistik."""
+    userlist = load_userlist()
+    nfc_to_user = _nfc_index(userlist)
+
+    created = 0
+    if create_missing and not dry_run:
+        created = create_missing_users(users_file, nfc_to_user)
+        if created:
+            userlist = load_userlist()
+            nfc_to_user = _nfc_index(userlist)
+
+    with tempfile.TemporaryDirectory(prefix="zfa_import_") as tmp_dir:
+        stats = partition_rows(attendance_file, nfc_to_user, tmp_dir, buckets)
+
+        users, added = 0, 0
+        changes = {}
+        for i in range(buckets):
+            bucket_users, bucket_added, bucket_changes = merge_bucket(
+                os.path.join(tmp_dir, f"bucket_{i}.txt"), userlist, dry_run)
+            users += bucket_users
+            added += bucket_added
+            changes.update(bucket_changes)
+
+    if changes and not dry_run:
+        mark_dirty_many(changes)
+        rebuild_presence_index()
+
+    stats.update({"created_users": created, "updated_users": users, "added_events": added})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importiert attendance.txt (attendancetxt.py) in die Nutzerordner.")
+    parser.add_argument("--attendance", default=ATTENDANCE_FILE, help="Pfad zu attendance.txt")
+    parser.add_argument("--users", default=USERS_FILE, help="Pfad zu mitarbeiter.txt")
+    parser.add_argument("--create-missing", action="store_true",
+                        help="unbekannte UIDs aus mitarbeiter.txt als Nutzer anlegen")
+    parser.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS,
+                        help="Anzahl Teildateien (mehr = weniger Speicher pro Durchlauf)")
+    parser.add_argument("--dry-run", action="store_true", help="nur zählen, nichts speichern")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.attendance):
+        print(f"❌ Datei '{args.attendance}' nicht gefunden.")
+        sys.exit(1)
+
+    stats = import_attendance(args.attendance, args.users, args.create_missing,
+                              max(1, args.buckets), args.dry_run)
+
+    print(f"{stats['rows']} Zeilen gelesen, {stats['invalid']} ungültig, "
+          f"{stats['unknown']} mit unbekannter UID.")
+    if stats["unknown_uids"]:
+        print("Unbekannte UIDs: " + ", ".join(sorted(stats["unknown_uids"])[:20])
+              + (" ..." if len(stats["unknown_uids"]) > 20 else ""))
+    prefix = "(Probelauf) " if args.dry_run else ""
+    print(f"✅ {prefix}{stats['added_events']} neue Einträge für {stats['updated_users']} Nutzer"
+          f" importiert, {stats['created_users']} Nutzer angelegt.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Prüft alle Nutzerordner (user_*/) parallel auf inkonsistente Zeitdaten und
+repariert sie auf Wunsch.
+
+    python integrity_check.py                    # nur prüfen, Ausgabe als JSON-Zeilen
+    python integrity_check.py --repair           # zusätzlich reparieren
+    python integrity_check.py --output check.jsonl --workers 8
+
+Jede Ausgabezeile ist ein Befund:
+{"folder": "user_3", "user_id": "3", "severity": "error", "code": "unpaired_in",
+ "index": 17, "time": "2025-10-14 08:01:12", "detail": "..."}
+
+Mit --repair kommen Befunde "dropped_event"/"added_event" für jeden verworfenen
+bzw. eingefügten Eintrag hinzu.
+
+Exit-Code 1, sobald ein Fehler (severity "error") nach dem Lauf noch besteht –
+mit --repair also z. B. bei invalid_json, missing_folder oder verwaisten Ordnern.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from zfa_utils import (load_userlist, write_json_atomic, bump_user_data_version, mark_dirty,
+                       timestamps_lock)
+from timeclock import DEFAULT_WORK_START, DEFAULT_WORK_END
+from presence import rebuild_presence_index
+
+# ==========================================================
+# KONSTANTEN
+# ==========================================================
+TIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+AUTO_IN = f"{DEFAULT_WORK_START[0]:02d}:{DEFAULT_WORK_START[1]:02d}:{DEFAULT_WORK_START[2]:02d}"
+AUTO_OUT = f"{DEFAULT_WORK_END[0]:02d}:{DEFAULT_WORK_END[1]:02d}:{DEFAULT_WORK_END[2]:02d}"
+
+
+def _problem(folder, user_id, severity, code, index=None, time=None, detail=""):
+    return {"folder": folder, "user_id": user_id, "severity": severity, "code": code,
+            "index": index, "time": time, "detail": detail}
+
+
+def _is_valid_entry(entry) -> bool:
+    """Prüft Aufbau und Zeitformat eines Eintrags (schnell, ohne strptime)."""
+    if not isinstance(entry, dict) or entry.get("type") not in ("in", "out"):
+        return False
+    time_str = entry.get("time")
+    if not isinstance(time_str, str) or not TIME_RE.match(time_str):
+        return False
+    try:
+        datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return False
+    return True
+
+
+# ==========================================================
+# PRÜFUNG
+# ==========================================================
+def check_sequence(entries: list, folder: str, user_id: str | None) -> list[dict]:
+    """Prüft eine Eintragsliste gegen die Regeln von timeclock.clock()."""
+    problems = []
+    previous = None
+    open_in = None
+    seen = set()
+
+    for index, entry in enumerate(entries):
+        if not _is_valid_entry(entry):
+            problems.append(_problem(folder, user_id, "error", "invalid_entry", index,
+                                     detail=f"Ungültiger Eintrag: {entry!r}"[:200]))
+            continue
+
+        event_type, time_str = entry["type"], entry["time"]
+        key = (event_type, time_str)
+        if key in seen:
+            problems.append(_problem(folder, user_id, "error", "duplicate", index, time_str,
+                                     "Eintrag ist doppelt vorhanden"))
+            continue
+        seen.add(key)
+
+        if previous and time_str < previous:
+            problems.append(_problem(folder, user_id, "error", "out_of_order", index, time_str,
+                                     f"liegt vor dem vorherigen Eintrag ({previous})"))
+        previous = max(previous or time_str, time_str)
+
+        if event_type == "in":
+            if open_in:
+                problems.append(_problem(folder, user_id, "error", "unpaired_in", index, time_str,
+                                         f"Anmeldung {open_in} ohne Abmeldung"))
+            open_in = time_str
+        else:
+            if not open_in:
+                problems.append(_problem(folder, user_id, "error", "unpaired_out", index, time_str,
+                                         "Abmeldung ohne vorherige Anmeldung"))
+            open_in = None
+
+    if open_in and open_in[:10] < datetime.now().strftime("%Y-%m-%d"):
+        problems.append(_problem(folder, user_id, "warning", "stale_open_in", len(entries) - 1, open_in,
+                                 "Offene Anmeldung vom Vortag (wird bei der nächsten Buchung automatisch geschlossen)"))
+
+    return problems
+
+
+# ==========================================================
+# REPARATUR
+# ==========================================================
+def repair_sequence(entries: list) -> tuple[list, list[tuple[str, str, str]]]:
+    """
+    Bringt eine Eintragsliste in einen gültigen Zustand nach den Regeln von clock():
+    ungültige und doppelte Einträge entfernen, nach Zeit sortieren, vergessene
+    Abmeldungen am Vortag mit Auto-Logout und Abmeldungen ohne Anmeldung mit
+    Auto-Login schließen (sonst verwerfen).
+    Liefert (reparierte Liste, Änderungen); jede Änderung ist (Code, Zeit, Detail)
+    mit Code "dropped_event" oder "added_event", damit nichts stillschweigend passiert.
+    """
+    valid = {(e["type"], e["time"]) for e in entries if _is_valid_entry(e)}
+    ordered = sorted(valid, key=lambda k: (k[1], 0 if k[0] == "out" else 1))
+
+    repaired = []
+    changes = []
+    open_in = None
+    for event_type, time_str in ordered:
+        day = time_str[:10]
+        if event_type == "in":
+            if open_in:
+                if open_in[:10] == day:
+                    # zweite Anmeldung am selben Tag → verwerfen
+                    changes.append(("dropped_event", time_str,
+                                    f"Anmeldung verworfen (bereits angemeldet seit {open_in})"))
+                    continue
+                auto_out = max(f"{open_in[:10]} {AUTO_OUT}", open_in)
+                repaired.append({"type": "out", "time": auto_out})
+                changes.append(("added_event", auto_out, f"Auto-Logout für Anmeldung {open_in} eingefügt"))
+            repaired.append({"type": "in", "time": time_str})
+            open_in = time_str
+        else:
+            if not open_in:
+                auto_in = f"{day} {AUTO_IN}"
+                previous = repaired[-1]["time"] if repaired else ""
+                if not (auto_in < time_str and auto_in > previous):
+                    # nicht sinnvoll zu schließen → verwerfen
+                    changes.append(("dropped_event", time_str,
+                                    "Abmeldung ohne Anmeldung verworfen (kein Auto-Login möglich)"))
+                    continue
+                repaired.append({"type": "in", "time": auto_in})
+                changes.append(("added_event", auto_in, f"Auto-Login für Abmeldung {time_str} eingefügt"))
+            repaired.append({"type": "out", "time": time_str})
+            open_in = None
+
+    return repaired, changes
+
+
+def _changed_months(before: list, after: list) -> list[str]:
+    """Monate ("YYYY-MM"), in denen sich Einträge durch die Reparatur geändert haben."""
+    old = {(e.get("type"), e.get("time")) for e in before if _is_valid_entry(e)}
+    new = {(e["type"], e["time"]) for e in after}
+    return sorted({t[:7] for _, t in old ^ new})
+
+
+def check_folder(folder: str, user_id: str | None, repair: bool = False) -> dict:
+    """
+    Prüft (und repariert) einen Nutzerordner. Läuft im Worker-Prozess.
+    Reparierte Dateien werden atomar ersetzt, das Original bleibt als .bak erhalten.
+    """
+    problems = []
+    changed_months = []
+    repaired_folder = False
+
+    if user_id is None:
+        problems.append(_problem(folder, None, "warning", "orphan_folder",
+                                 detail="Ordner gehört zu keinem Nutzer in userlist.txt"))
+
+    path = os.path.join(folder, f"{folder}_timestamps.txt")
+    if not os.path.exists(path):
+        return {"folder": folder, "user_id": user_id, "problems": problems,
+                "changed_months": [], "repaired": False}
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        if not isinstance(entries, list):
+            raise ValueError("keine Liste")
+    except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+        problems.append(_problem(folder, user_id, "error", "invalid_json", detail=str(e)[:200]))
+        return {"folder": folder, "user_id": user_id, "problems": problems,
+                "changed_months": [], "repaired": False}
+
+    sequence_problems = check_sequence(entries, folder, user_id)
+    problems.extend(sequence_problems)
+
+    if repair and user_id and any(p["severity"] == "error" for p in sequence_problems):
+        # Unter der Sperre neu lesen: seit der Prüfung kann gebucht worden sein
+        with timestamps_lock(path):
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            repaired, changes = repair_sequence(entries)
+            shutil.copy2(path, f"{path}.bak")
+            write_json_atomic(path, repaired)
+        changed_months = _changed_months(entries, repaired)
+        repaired_folder = True
+        for code, time_str, detail in changes:
+            problems.append(_problem(folder, user_id, "warning", code, time=time_str, detail=detail))
+
+    return {"folder": folder, "user_id": user_id, "problems": problems,
+            "changed_months": changed_months, "repaired": repaired_folder}
+
+
+def _check_folder_args(args):
+    return check_folder(*args)
+
+
+# ==========================================================
+# STARTPUNKT
+# ==========================================================
+def main():
+    parser = argparse.ArgumentParser(description="Prüft (und repariert) die Zeitdaten aller Nutzerordner.")
+    parser.add_argument("--repair", action="store_true", help="gefundene Fehler reparieren")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Anzahl paralleler Prozesse")
+    parser.add_argument("--output", help="Befunde in diese Datei schreiben (Standard: stdout)")
+    args = parser.parse_args()
+
+    userlist = load_userlist()
+    folder_to_user = {data["folder"]: uid for uid, data in userlist.items()}
+
+    folders = {name for name in os.listdir(".") if name.startswith("user_") and os.path.isdir(name)}
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    counts = {"error": 0, "warning": 0}
+    repaired = 0
+    unrepaired = 0  # Fehler, die nach dem Lauf noch bestehen
+
+    for folder, user_id in sorted(folder_to_user.items()):
+        if folder not in folders:
+            problem = _problem(folder, user_id, "error", "missing_folder",
+                               detail="Ordner aus userlist.txt existiert nicht")
+            out.write(json.dumps(problem, ensure_ascii=False) + "\n")
+            counts["error"] += 1
+            unrepaired += 1
+
+    jobs = [(folder, folder_to_user.get(folder), args.repair) for folder in sorted(folders)]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for result in pool.map(_check_folder_args, jobs, chunksize=64):
+            for problem in result["problems"]:
+                out.write(json.dumps(problem, ensure_ascii=False) + "\n")
+                counts[problem["severity"]] += 1
+                if problem["severity"] == "error" and not result["repaired"]:
+                    unrepaired += 1
+            if result["repaired"]:
+                # Versionen und Exporte im Hauptprozess nachziehen (keine parallelen Schreibzugriffe)
+                repaired += 1
+                bump_user_data_version(result["folder"])
+                for month_key in result["changed_months"]:
+                    mark_dirty(result["user_id"], month_key)
+
+    if args.output:
+        out.close()
+    if repaired:
+        rebuild_presence_index()
+
+    print(f"{len(folders)} Ordner geprüft: {counts['error']} Fehler, {counts['warning']} Warnungen, "
+          f"{repaired} Ordner repariert, {unrepaired} Fehler offen.", file=sys.stderr)
+    sys.exit(1 if unrepaired else 0)
+
+
+if __name__ == "__main__":
+    main()
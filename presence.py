@@ -0,0 +1,134 @@
+import os
+import re
+import json
+from datetime import datetime
+from zfa_utils import load_userlist, load_timestamps, write_json_atomic, file_lock
+
+# ==========================================================
+# Anwesenheitsindex (user_id → letzte Buchung)
+# ==========================================================
+PRESENCE_FILE = "presence.json"
+PRESENCE_LOCK = "presence.lock"
+TAIL_BYTES = 1024  # reicht für die letzten Einträge einer Timestamp-Datei
+
+_LAST_ENTRY_RE = re.compile(r'\{\s*"type":\s*"(in|out)",\s*"time":\s*"([^"]+)"\s*\}')
+
+
+def read_last_event(timestamps_path: str) -> dict | None:
+    """
+    Liest nur das Ende einer Timestamp-Datei und liefert den letzten Eintrag.
+    Fällt auf das vollständige Laden zurück, falls das Format abweicht.
+    """
+    if not os.path.exists(timestamps_path):
+        return None
+
+    with open(timestamps_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read().decode("utf-8", errors="ignore")
+
+    matches = _LAST_ENTRY_RE.findall(tail)
+    if matches:
+        event_type, time_str = matches[-1]
+        return {"type": event_type, "time": time_str}
+
+    try:
+        timestamps = load_timestamps(timestamps_path)
+    except json.JSONDecodeError:
+        return None
+    return timestamps[-1] if timestamps else None
+
+
+def _read_presence_file() -> dict | None:
+    """Liest presence.json; None, wenn sie fehlt oder defekt ist."""
+    if not os.path.exists(PRESENCE_FILE):
+        return None
+    try:
+        with open(PRESENCE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return None
+
+
+def _build_presence_index() -> dict:
+    """Ermittelt die letzte Buchung aller Nutzer aus dem Dateiende der Timestamp-Dateien."""
+    index = {}
+    for user_id, user_data in load_userlist().items():
+        folder = user_data["folder"]
+        last = read_last_event(os.path.join(folder, f"{folder}_timestamps.txt"))
+        if last:
+            index[user_id] = {"type": last["type"], "time": last["time"]}
+    return index
+
+
+def load_presence_index() -> dict:
+    """Lädt den Anwesenheitsindex; fehlt er, wird er neu aufgebaut."""
+    index = _read_presence_file()
+    if index is None:
+        return rebuild_presence_index()
+    return index
+
+
+def save_presence_index(index: dict) -> None:
+    """Speichert den Anwesenheitsindex."""
+    write_json_atomic(PRESENCE_FILE, index)
+
+
+def rebuild_presence_index() -> dict:
+    """Baut den Index aus dem Dateiende aller Timestamp-Dateien neu auf (beim Start)."""
+    with file_lock(PRESENCE_LOCK):
+        index = _build_presence_index()
+        save_presence_index(index)
+    return index
+
+
+def update_presence(user_id: str, entry: dict) -> None:
+    """
+    Trägt die letzte Buchung eines Nutzers ein. Wird von timeclock.clock() aufgerufen.
+    Die Sperre verhindert, dass gleichzeitige Buchungen sich gegenseitig überschreiben.
+    """
+    with file_lock(PRESENCE_LOCK):
+        index = _read_presence_file()
+        if index is None:
+            index = _build_presence_index()
+        index[user_id] = {"type": entry["type"], "time": entry["time"]}
+        save_presence_index(index)
+
+
+def presence_stamp() -> tuple:
+    """Kennung des aktuellen Stands von presence.json (ändert sich bei jedem Schreiben)."""
+    try:
+        stat = os.stat(PRESENCE_FILE)
+    except OSError:
+        return (0, 0, 0)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def get_presence(index: dict | None = None) -> dict:
+    """
+    Liefert den aktuellen Anwesenheitsstatus aller Nutzer.
+    Als anwesend gilt, wer heute eine Anmeldung ohne folgende Abmeldung hat
+    (vergessene Abmeldungen vom Vortag zählen nicht).
+    """
+    if index is None:
+        index = load_presence_index()
+    today_str = datetime.now().strftime("%Y-%m-%d")
+
+    users = []
+    for user_id, user_data in load_userlist().items():
+        last = index.get(user_id)
+        present = bool(last and last["type"] == "in" and last["time"].startswith(today_str))
+        users.append({
+            "user_id": user_id,
+            "name": f"{user_data['first_name']} {user_data['last_name']}",
+            "present": present,
+            "last_type": last["type"] if last else None,
+            "last_time": last["time"] if last else None,
+        })
+
+    return {
+        "present_count": sum(1 for u in users if u["present"]),
+        "total": len(users),
+        "users": users,
+    }
@@ -0,0 +1,139 @@
+"""
+Summiert die Tagesarbeitszeiten aller Mitglieder je Gruppe und Ebene.
+Pro Monat wird ein Cache (reports/rollup_YYYY_MM.json) gehalten:
+
+{"members": {"1": {"version": [3, 1697...], "path": ["Berlin", "4711", "Einkauf"],
+                   "daily": {"2025-10-01": 28800}}},
+ "groups": {"site": {"Berlin": {"daily": {...}, "members": ["1", ...]}},
+            "site/cost_center": {"Berlin / 4711": {...}}, ...}}
+
+Ändern sich die Zeitdaten oder die Gruppen eines Mitglieds (erkennbar an
+der Datenversion bzw. userlist.txt), werden nur dessen alte Beiträge
+abgezogen und die neuen addiert.
+"""
+
+import os
+import json
+from calendar import monthrange
+from zfa_utils import (
+    load_userlist,
+    get_user_data_version,
+    write_json_atomic,
+    local_cache,
+    seconds_to_hours_minutes_str,
+)
+from timesheet import get_daily_seconds
+from user_management import GROUP_FIELDS
+
+# ==========================================================
+# ROLL-UP-REPORTS (Standort → Kostenstelle → Team)
+# ==========================================================
+NO_GROUP = "(ohne)"
+LEVELS = ["/".join(GROUP_FIELDS[:i + 1]) for i in range(len(GROUP_FIELDS))]
+
+
+def _cache_path(year: int, month: int) -> str:
+    return os.path.join("reports", f"rollup_{year}_{month:02d}.json")
+
+
+def _load_cache(year: int, month: int) -> dict:
+    path = _cache_path(year, month)
+    if not os.path.exists(path):
+        return {"members": {}, "groups": {level: {} for level in LEVELS}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {"members": {}, "groups": {level: {} for level in LEVELS}}
+
+
+def _group_path(user_data: dict) -> list[str]:
+    return [user_data.get(field) or NO_GROUP for field in GROUP_FIELDS]
+
+
+def _apply(groups: dict, user_id: str, path: list, daily: dict, sign: int) -> None:
+    """Addiert (sign=1) oder entfernt (sign=-1) die Tageswerte eines Mitglieds auf allen Ebenen."""
+    for depth, level in enumerate(LEVELS):
+        key = " / ".join(path[:depth + 1])
+        group = groups[level].setdefault(key, {"daily": {}, "members": []})
+        for day, seconds in daily.items():
+            value = group["daily"].get(day, 0) + sign * seconds
+            if value:
+                group["daily"][day] = value
+            else:
+                group["daily"].pop(day, None)
+        if sign > 0:
+            group["members"].append(user_id)
+        else:
+            group["members"].remove(user_id)
+            if not group["members"]:
+                del groups[level][key]
+
+
+def update_rollup(year: int, month: int) -> dict:
+    """
+    Bringt den Roll-up-Cache eines Monats auf den aktuellen Stand und
+    berechnet dabei nur Mitglieder neu, deren Daten sich geändert haben.
+    """
+    cache = _load_cache(year, month)
+    members = cache["members"]
+    groups = cache["groups"]
+    userlist = load_userlist()
+
+    start_date = f"{year}-{month:02d}-01"
+    end_date = f"{year}-{month:02d}-{monthrange(year, month)[1]:02d}"
+    changed = False
+
+    # Entfernte Nutzer abziehen
+    for user_id in [uid for uid in members if uid not in userlist]:
+        old = members.pop(user_id)
+        _apply(groups, user_id, old["path"], old["daily"], -1)
+        changed = True
+
+    for user_id, user_data in userlist.items():
+        version = list(get_user_data_version(user_data["folder"]))
+        path = _group_path(user_data)
+        old = members.get(user_id)
+        if old and old["version"] == version and old["path"] == path:
+            continue
+
+        if old and old["version"] == version:
+            daily = old["daily"]  # nur die Gruppe hat sich geändert
+        else:
+            daily = {day: round(sec) for day, sec in
+                     get_daily_seconds(user_data["folder"], start_date, end_date).items() if sec}
+
+        if old:
+            _apply(groups, user_id, old["path"], old["daily"], -1)
+        _apply(groups, user_id, path, daily, 1)
+        members[user_id] = {"version": version, "path": path, "daily": daily}
+        changed = True
+
+    if changed:
+        os.makedirs("reports", exist_ok=True)
+        write_json_atomic(_cache_path(year, month), cache)
+
+    return cache
+
+
+def get_rollup(year: int, month: int, level: str = LEVELS[0]) -> dict:
+    """Liefert die Gruppensummen einer Ebene (z. B. "site/cost_center") für einen Monat."""
+    if level not in LEVELS:
+        return {"error": f"Unbekannte Ebene {level}"}
+
+    def build():
+        cache = update_rollup(year, month)
+        rows = []
+        for key, group in sorted(cache["groups"][level].items()):
+            total_seconds = sum(group["daily"].values())
+            rows.append({
+                "group": key,
+                "members": len(group["members"]),
+                "total_hours": round(total_seconds / 3600, 2),
+                "total_hm": seconds_to_hours_minutes_str(total_seconds),
+                "daily_hours": {day: round(sec / 3600, 2) for day, sec in sorted(group["daily"].items())},
+            })
+        return {"year": year, "month": month, "level": level, "levels": LEVELS, "groups": rows}
+
+    # Ohne Datenänderung seit dem letzten Aufruf: direkt aus dem Speicher
+    return local_cache(("rollup", year, month, level), build)
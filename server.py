@@ -0,0 +1,88 @@
+"""
+Produktionsstart der Weboberfläche mit einem Prefork-WSGI-Server (gunicorn).
+
+    python server.py --workers 4 --threads 8 --bind 0.0.0.0:8080
+
+Alle Einstellungen können auch über Umgebungsvariablen gesetzt werden
+(ZFA_WORKERS, ZFA_THREADS, ZFA_BIND, ZFA_TIMEOUT). Für die Entwicklung
+bleibt "python app.py" (Flask-Debugserver) bestehen.
+
+Caches in den Workern bleiben über den gemeinsamen Änderungszähler in
+zfa_utils (data_version.bin) aktuell.
+"""
+import os
+import argparse
+import multiprocessing
+
+# ==========================================================
+# STANDARDWERTE
+# ==========================================================
+DEFAULT_BIND = "0.0.0.0:8080"
+DEFAULT_THREADS = 4
+DEFAULT_TIMEOUT = 60  # Sekunden
+
+
+def default_workers() -> int:
+    """Übliche Faustregel für gunicorn: 2 × CPU-Kerne + 1."""
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Startet die Zeiterfassung im Produktionsbetrieb.")
+    parser.add_argument("--bind", default=os.environ.get("ZFA_BIND", DEFAULT_BIND),
+                        help="Adresse:Port (Standard: %(default)s)")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("ZFA_WORKERS", default_workers())),
+                        help="Anzahl Worker-Prozesse (Standard: %(default)s)")
+    parser.add_argument("--threads", type=int,
+                        default=int(os.environ.get("ZFA_THREADS", DEFAULT_THREADS)),
+                        help="Threads pro Worker, u. a. für SSE-Verbindungen (Standard: %(default)s)")
+    parser.add_argument("--timeout", type=int,
+                        default=int(os.environ.get("ZFA_TIMEOUT", DEFAULT_TIMEOUT)),
+                        help="Worker-Timeout in Sekunden (Standard: %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ gunicorn ist nicht installiert (pip install gunicorn).")
+        raise SystemExit(1)
+
+    from app import app
+    from presence import rebuild_presence_index
+
+    class ZeiterfassungServer(BaseApplication):
+        """Bindet die Flask-App ohne separate Konfigurationsdatei an gunicorn."""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    # Einmal im Master-Prozess, bevor die Worker starten
+    rebuild_presence_index()
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread",
+        "timeout": args.timeout,
+    }
+    print(f"✅ Zeiterfassung startet auf {args.bind} ({args.workers} Worker × {args.threads} Threads)")
+    ZeiterfassungServer(app, options).run()
+
+
+if __name__ == "__main__":
+    main()
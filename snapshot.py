@@ -0,0 +1,179 @@
+"""
+Konsistente Lese-Snapshots für lange Auswertungen (Exporte, Reports).
+
+Alle Schreibfunktionen ersetzen Dateien atomar (neue Datei + os.replace),
+ändern also nie eine bestehende Datei. Ein Snapshot besteht deshalb nur aus
+Hardlinks auf den aktuellen Stand von userlist.txt, allen Timestamp-Dateien
+und den Jahreszusammenfassungen: Er kostet einen Link pro Datei, kopiert
+keine Daten und hält keine Sperre, die clock() verzögern würde.
+
+    with read_snapshot():
+        export_monthly_report_json(2025, 10)   # liest nur aus dem Snapshot
+"""
+
+import os
+import shutil
+from datetime import datetime
+from contextlib import contextmanager
+from zfa_utils import (
+    load_userlist,
+    get_shared_version,
+    archive_dir,
+    set_read_root,
+    reset_read_root,
+)
+
+# ==========================================================
+# KONSTANTEN
+# ==========================================================
+SNAPSHOT_DIR = "snapshots"
+MAX_ATTEMPTS = 3  # erneuter Versuch, wenn während des Anlegens gebucht wurde
+
+
+def _link(src: str, dst: str) -> None:
+    """Hardlink, falls das Dateisystem keine unterstützt: Kopie."""
+    if not os.path.exists(src):
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _build_snapshot(path: str) -> None:
+    os.makedirs(path)
+    _link("userlist.txt", os.path.join(path, "userlist.txt"))
+
+    # Nutzerliste aus dem Snapshot selbst, damit Ordner und Liste zusammenpassen
+    token = set_read_root(path)
+    try:
+        userlist = load_userlist()
+    finally:
+        reset_read_root(token)
+
+    for user_data in userlist.values():
+        folder = user_data["folder"]
+        os.makedirs(os.path.join(path, folder), exist_ok=True)
+        timestamps = os.path.join(folder, f"{folder}_timestamps.txt")
+        _link(timestamps, os.path.join(path, timestamps))
+
+        archive = archive_dir(folder)
+        if os.path.isdir(archive):
+            os.makedirs(os.path.join(path, archive), exist_ok=True)
+            for name in os.listdir(archive):
+                if name.endswith("_summary.json") or name.endswith(".jsonl.gz"):
+                    _link(os.path.join(archive, name), os.path.join(path, archive, name))
+
+
+def create_snapshot() -> str:
+    """
+    Legt einen Snapshot an und liefert dessen Verzeichnis. Ändert sich der
+    Datenbestand während des Anlegens, wird bis zu MAX_ATTEMPTS-mal neu
+    begonnen; jede einzelne Datei ist in jedem Fall in sich konsistent.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    for attempt in range(MAX_ATTEMPTS):
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+        path = os.path.join(SNAPSHOT_DIR, name)
+        version_before = get_shared_version()
+        _build_snapshot(path)
+        if get_shared_version() == version_before or attempt == MAX_ATTEMPTS - 1:
+            return path
+        shutil.rmtree(path, ignore_errors=True)
+    return path
+
+
+def remove_snapshot(path: str) -> None:
+    """Entfernt einen Snapshot (nur die Links, nicht die Live-Daten)."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def read_snapshot():
+    """
+    Führt den Block mit einem frischen Snapshot als Lesebasis aus
+    (load_userlist, load_timestamps, Archive). Der Snapshot wird danach entfernt.
+    """
+    path = create_snapshot()
+    token = set_read_root(path)
+    try:
+        yield path
+    finally:
+        reset_read_root(token)
+        remove_snapshot(path)
+
+
+# ==========================================================
+# STARTPUNKT (nur für manuelle Tests)
+# ==========================================================
+if __name__ == "__main__":
+    # Belastungstest in einem temporären Verzeichnis: mehrere Terminals buchen
+    # ununterbrochen, während parallel Monatsreports aus Snapshots entstehen.
+    # Innerhalb eines Snapshots muss ein zweites Lesen nach einer Pause exakt
+    # denselben Stand liefern wie das erste – ohne Isolation ändern die
+    # laufenden Buchungen die Zahl der Einträge dazwischen.
+    import sys
+    import time
+    import tempfile
+    import threading
+
+    with tempfile.TemporaryDirectory(prefix="zfa_snapshot_test_") as tmp:
+        os.chdir(tmp)
+        from user_management import add_user
+        from timeclock import clock
+        from timesheet import get_monthly_report
+        from zfa_utils import load_timestamps
+
+        for i in range(20):
+            add_user(f"Test{i}", "Nutzer")
+        userlist = load_userlist()
+        stop = threading.Event()
+        taps = {"count": 0}
+
+        def tap_storm(user_id):
+            while not stop.is_set():
+                clock(user_id)
+                taps["count"] += 1
+
+        def read_state():
+            """Monatsreport und alle Buchungen aus der aktuellen Lesebasis."""
+            report = get_monthly_report(now.year, now.month)
+            events = {
+                uid: load_timestamps(os.path.join(data["folder"], f"{data['folder']}_timestamps.txt"))
+                for uid, data in userlist.items()
+            }
+            return report, events
+
+        terminals = [threading.Thread(target=tap_storm, args=(uid,)) for uid in userlist]
+        for t in terminals:
+            t.start()
+
+        now = datetime.now()
+        errors = []
+        exports = 0
+        try:
+            while exports < 30:
+                exports += 1
+                try:
+                    with read_snapshot():
+                        first = read_state()
+                        time.sleep(0.05)  # Terminals buchen weiter
+                        second = read_state()
+                    if first != second:
+                        errors.append(f"Export {exports}: Daten haben sich während des Exports geändert")
+                    if set(first[0]["users"]) != set(userlist):
+                        errors.append(f"Export {exports}: Nutzerliste unvollständig")
+                except Exception as e:  # jeder Fehler ist ein Testfehler
+                    errors.append(f"Export {exports}: {e!r}")
+        finally:
+            stop.set()
+            for t in terminals:
+                t.join()
+
+        print(f"{exports} Exporte bei {taps['count']} Buchungen, {len(errors)} Fehler.")
+        for error in errors[:5]:
+            print("❌", error)
+        if errors or not taps["count"]:
+            print("❌ Snapshot-Test fehlgeschlagen.")
+            sys.exit(1)
+        print("✅ Snapshot-Test bestanden.")
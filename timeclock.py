@@ -6,7 +6,11 @@ from zfa_utils import (
     save_timestamps,
     seconds_to_hours_minutes_str,
     set_pending_corrections_flag,
+    mark_dirty,
+    timestamps_lock,
 )
+from presence import update_presence
+from error_log import log_event
 
 # ==========================================================
 # KONSTANTEN – Standard-Arbeitszeiten
@@ -26,12 +30,10 @@ DEFAULT_LATE_LOGIN = 15          # 15:00 Uhr
 def log_error(user_id: str, user_name: str, message: str) -> None:
     """
     Schreibt einen Fehlerfall (vergessener Login/Logout etc.)
-    mit Zeitstempel in die Datei error_log.txt.
+    mit Zeitstempel in das strukturierte Fehlerprotokoll (logs/error_log.jsonl).
+    Das Schreiben übernimmt ein Hintergrund-Thread.
     """
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"{now} | User {user_id} ({user_name}) | Fehler: {message}\n"
-    with open("error_log.txt", "a", encoding="utf-8") as f:
-        f.write(entry)
+    log_event(user_id, user_name, message)
 
 
 # ==========================================================
@@ -51,7 +53,14 @@ def clock(user_id: str) -> str:
     user_folder = user_data["folder"]
     timestamps_path = os.path.join(user_folder, f"{user_folder}_timestamps.txt")
 
+    with timestamps_lock(timestamps_path):
+        return _clock_locked(user_id, user_data, timestamps_path)
+
+
+def _clock_locked(user_id: str, user_data: dict, timestamps_path: str) -> str:
+    """Eigentliche Buchung; läuft unter timestamps_lock()."""
     timestamps = load_timestamps(timestamps_path)
+    previous_count = len(timestamps)
     now_dt = datetime.now()
 
     # Fall A: Letzter Eintrag war "in" → normaler oder vergessener Logout
@@ -130,6 +139,13 @@ def clock(user_id: str) -> str:
     timestamps.append({"type": action, "time": now_dt.strftime("%Y-%m-%d %H:%M:%S")})
     save_timestamps(timestamps_path, timestamps)
 
+    # Betroffene Monate für den inkrementellen Export vormerken
+    for entry in timestamps[previous_count:]:
+        mark_dirty(user_id, entry["time"])
+
+    # Anwesenheitsindex aktualisieren
+    update_presence(user_id, timestamps[-1])
+
     return message
 
 
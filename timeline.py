@@ -0,0 +1,160 @@
+import os
+import json
+from zfa_utils import load_userlist, archived_years, iter_archived_events, write_json_atomic
+
+# ==========================================================
+# KONSTANTEN
+# ==========================================================
+CHUNK_SIZE = 64 * 1024
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+# ==========================================================
+# STREAMING-LESER FÜR TIMESTAMP-DATEIEN
+# ==========================================================
+def iter_entries(path: str, offset: int = 0):
+    """
+    Liest die Einträge einer Timestamp-Datei ab einem Byte-Offset, ohne die
+    ganze Datei zu laden. Liefert (Offset, Eintrag). Die Einträge sind flache
+    JSON-Objekte ({"type": ..., "time": ...}), daher genügt die Suche nach
+    den geschweiften Klammern.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        buf = b""
+        base = offset
+        while True:
+            start = buf.find(b"{")
+            end = buf.find(b"}", start) if start >= 0 else -1
+            if start < 0 or end < 0:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                if start < 0:
+                    base += len(buf)
+                    buf = chunk
+                else:
+                    buf += chunk
+                continue
+            yield base + start, json.loads(buf[start:end + 1])
+            base += end + 1
+            buf = buf[end + 1:]
+
+
+def _index_path(user_folder: str) -> str:
+    return os.path.join(user_folder, f"{user_folder}_timestamps.idx.json")
+
+
+def month_offsets(user_folder: str) -> dict:
+    """
+    Offset des ersten Eintrags je Monat in der aktiven Timestamp-Datei.
+    Der Index wird neu aufgebaut (ein Streaming-Durchlauf), sobald sich die
+    Datei geändert hat.
+    """
+    path = os.path.join(user_folder, f"{user_folder}_timestamps.txt")
+    if not os.path.exists(path):
+        return {}
+    stat = os.stat(path)
+
+    index_path = _index_path(user_folder)
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("size") == stat.st_size and index.get("mtime_ns") == stat.st_mtime_ns:
+                return index["months"]
+        except (json.JSONDecodeError, KeyError):
+            pass
+
+    months = {}
+    for offset, entry in iter_entries(path):
+        months.setdefault(entry["time"][:7], offset)
+
+    write_json_atomic(index_path, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "months": months})
+    return months
+
+
+# ==========================================================
+# SEITENWEISE ABFRAGE
+# ==========================================================
+def _parse_cursor(cursor: str) -> tuple[str, int]:
+    """Cursor-Format: "<Zeit>#<Anzahl bereits gelieferter Einträge mit dieser Zeit>"."""
+    time_str, _, seen = cursor.rpartition("#")
+    return time_str, int(seen) if seen.isdigit() else 0
+
+
+def _iter_user_events(user_folder: str, start: str):
+    """Alle Buchungen ab start (Archiv-Jahre, dann aktive Datei), chronologisch."""
+    for year in archived_years(user_folder):
+        if str(year) < start[:4]:
+            continue
+        for entry in iter_archived_events(user_folder, year):
+            if entry["time"] >= start:
+                yield entry
+
+    months = month_offsets(user_folder)
+    candidates = [offset for month, offset in months.items() if month >= start[:7]]
+    if not candidates:
+        return
+    path = os.path.join(user_folder, f"{user_folder}_timestamps.txt")
+    for _, entry in iter_entries(path, min(candidates)):
+        if entry["time"] >= start:
+            yield entry
+
+
+def get_events_page(user_id: str, date_from: str = None, date_to: str = None,
+                    cursor: str = None, limit: int = DEFAULT_LIMIT) -> dict:
+    """
+    Liefert eine Seite von Buchungen eines Nutzers (chronologisch).
+    date_from / date_to: "YYYY-MM-DD" (einschließlich).
+    cursor: "next_cursor" der vorherigen Seite; für Lohnabrechnungen kann
+    der zuletzt gespeicherte Cursor als Startpunkt für neue Buchungen dienen.
+    "next_cursor" zeigt immer auf das letzte gelieferte Ereignis (bei leerer
+    Seite bleibt der übergebene Cursor), "has_more" meldet weitere Seiten.
+    """
+    userlist = load_userlist()
+    if user_id not in userlist:
+        return {"error": f"Unbekannte User-ID {user_id}"}
+
+    user_folder = userlist[user_id]["folder"]
+    limit = max(1, min(limit, MAX_LIMIT))
+    start = date_from or ""
+    end = f"{date_to} 23:59:59" if date_to else None
+
+    cursor_time, cursor_seen = _parse_cursor(cursor) if cursor else ("", 0)
+    start = max(start, cursor_time)
+
+    events = []
+    same_time_seen = 0
+    last_time = None
+    has_more = False
+
+    for entry in _iter_user_events(user_folder, start):
+        time_str = entry["time"]
+        if end and time_str > end:
+            break
+
+        same_time_seen = same_time_seen + 1 if time_str == last_time else 1
+        last_time = time_str
+        if cursor and time_str == cursor_time and same_time_seen <= cursor_seen:
+            continue  # bereits auf der vorherigen Seite geliefert
+
+        if len(events) == limit:
+            has_more = True
+            break
+        events.append({"type": entry["type"], "time": time_str})
+
+    # Cursor immer auf das zuletzt gelieferte Ereignis setzen, auch auf der
+    # letzten Seite – damit lassen sich später neue Buchungen abholen
+    next_cursor = cursor
+    if events:
+        last = events[-1]["time"]
+        seen = sum(1 for e in events if e["time"] == last)
+        if cursor and last == cursor_time:
+            seen += cursor_seen
+        next_cursor = f"{last}#{seen}"
+
+    return {"user_id": user_id, "events": events, "next_cursor": next_cursor, "has_more": has_more}
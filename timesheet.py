@@ -2,42 +2,82 @@ import os
 import json
 from datetime import datetime, timedelta
 from calendar import monthrange
-from zfa_utils import load_userlist, load_timestamps, seconds_to_hours_minutes_str
+from zfa_utils import (
+    load_userlist,
+    load_timestamps,
+    seconds_to_hours_minutes_str,
+    load_balance_checkpoints,
+    save_balance_checkpoints,
+    balance_lock,
+    archived_years,
+    load_archive_summary,
+)
+from timeclock import DEFAULT_WORK_START, DEFAULT_WORK_END
 
 
-def get_worked_hours(user_id: str, start_date: str, end_date: str) -> dict:
-    """Berechnet die geleisteten Arbeitsstunden eines Nutzers im angegebenen Zeitraum."""
-    userlist = load_userlist()
-    if user_id not in userlist:
-        return {"error": f"Unbekannte User-ID {user_id}"}
-
-    user_data = userlist[user_id]
-    user_folder = user_data["folder"]
-    timestamps_path = os.path.join(user_folder, f"{user_folder}_timestamps.txt")
-    timestamps = load_timestamps(timestamps_path)
-
-    start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-    end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-
-    total_seconds = 0
-    details = {}
+def daily_worked_seconds(entries) -> dict:
+    """
+    Paart in/out-Einträge und summiert die Arbeitszeit je Tag (Sekunden).
+    Eine Sitzung zählt zu dem Tag, an dem sie begonnen hat.
+    """
+    daily = {}
     current_in = None
 
-    for entry in timestamps:
+    for entry in entries:
         ts_time = datetime.strptime(entry["time"], "%Y-%m-%d %H:%M:%S")
 
-        if not (start_dt <= ts_time < end_dt):
-            continue
-
         if entry["type"] == "in":
             current_in = ts_time
         elif entry["type"] == "out" and current_in:
-            worked = (ts_time - current_in).total_seconds()
-            total_seconds += worked
             day_str = current_in.strftime("%Y-%m-%d")
-            details[day_str] = details.get(day_str, 0) + worked / 3600
+            daily[day_str] = daily.get(day_str, 0) + (ts_time - current_in).total_seconds()
             current_in = None
 
+    return daily
+
+
+def get_daily_seconds(user_folder: str, start_date: str, end_date: str, timestamps: list = None) -> dict:
+    """
+    Arbeitszeit je Tag (Sekunden, ungerundet) eines Nutzerordners im Zeitraum.
+    Archivierte Jahre werden über ihre Tagessummen einbezogen.
+    """
+    if timestamps is None:
+        timestamps = load_timestamps(os.path.join(user_folder, f"{user_folder}_timestamps.txt"))
+
+    start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+    end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+
+    in_range = (
+        entry for entry in timestamps
+        if start_dt <= datetime.strptime(entry["time"], "%Y-%m-%d %H:%M:%S") < end_dt
+    )
+    daily = daily_worked_seconds(in_range)
+
+    # Abgeschlossene Jahre liegen nur noch als Archiv mit Tagessummen vor
+    for year in range(start_dt.year, end_dt.year + 1):
+        summary = load_archive_summary(user_folder, year)
+        if not summary:
+            continue
+        for day_str, seconds in summary["daily"].items():
+            if start_date <= day_str <= end_date:
+                daily[day_str] = daily.get(day_str, 0) + seconds
+
+    return daily
+
+
+def get_worked_hours(user_id: str, start_date: str, end_date: str) -> dict:
+    """
+    Berechnet die geleisteten Arbeitsstunden eines Nutzers im angegebenen Zeitraum.
+    Archivierte Jahre (siehe archive.py) werden über ihre Tagessummen einbezogen.
+    """
+    userlist = load_userlist()
+    if user_id not in userlist:
+        return {"error": f"Unbekannte User-ID {user_id}"}
+
+    user_data = userlist[user_id]
+    daily = get_daily_seconds(user_data["folder"], start_date, end_date)
+    total_seconds = sum(daily.values())
+
     return {
         "user_id": user_id,
         "name": f"{user_data['first_name']} {user_data['last_name']}",
@@ -46,10 +86,10 @@ def get_worked_hours(user_id: str, start_date: str, end_date: str) -> dict:
         "details": [
             {
                 "date": d,
-                "worked_hours": round(h, 2),
-                "worked_hm": seconds_to_hours_minutes_str(h * 3600)
+                "worked_hours": round(sec / 3600, 2),
+                "worked_hm": seconds_to_hours_minutes_str(sec)
             }
-            for d, h in sorted(details.items())
+            for d, sec in sorted(daily.items())
         ]
     }
 
@@ -69,15 +109,171 @@ def get_monthly_report(year: int, month: int) -> dict:
     return {"year": year, "month": month, "users": report}
 
 
-def export_monthly_report_json(year: int, month: int) -> str:
-    """Exportiert den Monatsreport aller Nutzer als JSON-formatierte TXT-Datei im Ordner 'reports/'."""
-    report = get_monthly_report(year, month)
+def _report_path(year: int, month: int) -> str:
+    """Pfad der Monatsreport-Datei im Ordner 'reports/'."""
+    return os.path.join("reports", f"monthly_report_{year}_{month:02d}.txt")
 
-    reports_dir = "reports"
-    os.makedirs(reports_dir, exist_ok=True)
-    filename = os.path.join(reports_dir, f"monthly_report_{year}_{month:02d}.txt")
+
+def _write_report(year: int, month: int, report: dict) -> str:
+    """Schreibt einen Monatsreport und gibt den Dateinamen zurück."""
+    os.makedirs("reports", exist_ok=True)
+    filename = _report_path(year, month)
 
     with open(filename, "w", encoding="utf-8") as f:
         json.dump(report, f, indent=4, ensure_ascii=False)
 
+    return filename
+
+
+def export_monthly_report_json(year: int, month: int) -> str:
+    """Exportiert den Monatsreport aller Nutzer als JSON-formatierte TXT-Datei im Ordner 'reports/'."""
+    report = get_monthly_report(year, month)
+    filename = _write_report(year, month, report)
+
     return f"Monatsreport {month:02d}/{year} wurde nach '{filename}' exportiert."
+
+
+def update_monthly_report_json(year: int, month: int, user_ids: list) -> str:
+    """
+    Aktualisiert im bestehenden Monatsreport nur die angegebenen Nutzer.
+    Alle anderen Einträge werden aus der vorhandenen Datei übernommen.
+    Existiert noch kein Report, wird er vollständig erstellt.
+    """
+    filename = _report_path(year, month)
+    if not os.path.exists(filename):
+        return export_monthly_report_json(year, month)
+
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            existing = json.load(f).get("users", {})
+    except json.JSONDecodeError:
+        return export_monthly_report_json(year, month)
+
+    start_date = f"{year}-{month:02d}-01"
+    last_day = monthrange(year, month)[1]
+    end_date = f"{year}-{month:02d}-{last_day:02d}"
+
+    userlist = load_userlist()
+    report = {}
+    recomputed = 0
+
+    for user_id in userlist.keys():
+        if user_id in user_ids or user_id not in existing:
+            report[user_id] = get_worked_hours(user_id, start_date, end_date)
+            recomputed += 1
+        else:
+            report[user_id] = existing[user_id]
+
+    # Nichts neu berechnet und kein Nutzer entfernt → Datei bleibt unangetastet
+    if not recomputed and existing.keys() <= userlist.keys():
+        return f"Monatsreport {month:02d}/{year} ist unverändert."
+
+    _write_report(year, month, {"year": year, "month": month, "users": report})
+
+    return f"Monatsreport {month:02d}/{year} wurde in '{filename}' aktualisiert ({recomputed} Nutzer neu berechnet)."
+
+
+# ==========================================================
+# GLEITZEITKONTO (Saldo aus Ist- und Sollstunden)
+# ==========================================================
+def daily_target_seconds() -> int:
+    """Tägliche Sollzeit aus DEFAULT_WORK_START bis DEFAULT_WORK_END (Mo–Fr)."""
+    start = DEFAULT_WORK_START[0] * 3600 + DEFAULT_WORK_START[1] * 60 + DEFAULT_WORK_START[2]
+    end = DEFAULT_WORK_END[0] * 3600 + DEFAULT_WORK_END[1] * 60 + DEFAULT_WORK_END[2]
+    return end - start
+
+
+def _target_seconds(start_day, end_day) -> int:
+    """Sollzeit aller Werktage (Mo–Fr) von start_day bis einschließlich end_day."""
+    days = 0
+    day = start_day
+    while day <= end_day:
+        if day.weekday() < 5:
+            days += 1
+        day += timedelta(days=1)
+    return days * daily_target_seconds()
+
+
+def _signed_hm(seconds: float) -> str:
+    """Wie seconds_to_hours_minutes_str, aber mit Vorzeichen für negative Salden."""
+    if seconds < 0:
+        return "-" + seconds_to_hours_minutes_str(-seconds)
+    return seconds_to_hours_minutes_str(seconds)
+
+
+def _next_month(month_key: str) -> str:
+    year, month = int(month_key[:4]), int(month_key[5:7])
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year}-{month:02d}"
+
+
+def get_flexitime_balance(user_id: str) -> dict:
+    """
+    Berechnet das Gleitzeitkonto eines Nutzers.
+    Abgeschlossene Monate werden als Checkpoints gespeichert; live berechnet
+    wird nur der laufende Monat (bzw. fehlende Checkpoints nach Korrekturen).
+    """
+    userlist = load_userlist()
+    if user_id not in userlist:
+        return {"error": f"Unbekannte User-ID {user_id}"}
+
+    user_data = userlist[user_id]
+    user_folder = user_data["folder"]
+    today = datetime.now().date()
+    current_month = today.strftime("%Y-%m")
+
+    # Sperre über Laden, Nachberechnen und Speichern, damit eine gleichzeitige
+    # Invalidierung (mark_dirty_many) nicht überschrieben wird
+    with balance_lock(user_folder):
+        checkpoints = load_balance_checkpoints(user_folder)
+        start_date = checkpoints.get("start_date")
+        changed = False
+        if not start_date:
+            # Beginn = erste Buchung (nur beim ersten Aufruf nötig)
+            years = archived_years(user_folder)
+            if years:
+                start_date = load_archive_summary(user_folder, years[0])["first"][:10]
+            else:
+                timestamps = load_timestamps(os.path.join(user_folder, f"{user_folder}_timestamps.txt"))
+                start_date = timestamps[0]["time"][:10] if timestamps else today.strftime("%Y-%m-%d")
+            checkpoints = {"start_date": start_date, "months": {}}
+            changed = True
+        months = checkpoints.setdefault("months", {})
+        start_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+
+        # Fehlende Checkpoints für abgeschlossene Monate nachberechnen
+        carry = 0
+        month_key = start_date[:7]
+        while month_key < current_month:
+            if month_key not in months:
+                year, month = int(month_key[:4]), int(month_key[5:7])
+                first_day = max(start_day, datetime(year, month, 1).date())
+                last_day = datetime(year, month, monthrange(year, month)[1]).date()
+                worked = sum(get_daily_seconds(user_folder, first_day.strftime("%Y-%m-%d"),
+                                               last_day.strftime("%Y-%m-%d")).values())
+                target = _target_seconds(first_day, last_day)
+                months[month_key] = {"worked": round(worked), "target": target,
+                                     "carry": round(carry + worked - target)}
+                changed = True
+            carry = months[month_key]["carry"]
+            month_key = _next_month(month_key)
+
+        if changed:
+            save_balance_checkpoints(user_folder, checkpoints)
+
+    # Laufender Monat: live
+    first_day = max(start_day, today.replace(day=1))
+    worked = sum(get_daily_seconds(user_folder, first_day.strftime("%Y-%m-%d"),
+                                   today.strftime("%Y-%m-%d")).values())
+    target = _target_seconds(first_day, today)
+    balance = carry + worked - target
+
+    return {
+        "user_id": user_id,
+        "name": f"{user_data['first_name']} {user_data['last_name']}",
+        "carry_over_hours": round(carry / 3600, 2),
+        "month_worked_hours": round(worked / 3600, 2),
+        "month_target_hours": round(target / 3600, 2),
+        "balance_hours": round(balance / 3600, 2),
+        "balance_hm": _signed_hm(balance),
+    }
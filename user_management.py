@@ -1,6 +1,9 @@
 import os
 from zfa_utils import load_userlist, save_userlist
 
+# Optionale Gruppierungsmerkmale für Roll-up-Reports (Standort → Kostenstelle → Team)
+GROUP_FIELDS = ("site", "cost_center", "team")
+
 def _next_free_id(userlist: dict) -> str:
     if not userlist:
         return "1"
@@ -8,7 +11,8 @@ def _next_free_id(userlist: dict) -> str:
     return str(max(existing) + 1 if existing else 1)
 
 def add_user(first_name: str, last_name: str,
-             nfc_code: str = None, password: str = None, role: str = "user") -> str:
+             nfc_code: str = None, password: str = None, role: str = "user",
+             team: str = None, cost_center: str = None, site: str = None) -> str:
     """Fügt einen neuen Nutzer hinzu, vergibt automatisch die nächste freie ID und legt den Ordner an."""
     userlist = load_userlist()
 
@@ -24,13 +28,22 @@ def add_user(first_name: str, last_name: str,
         "password": password or "",
         "role": role
     }
+    groups = {"site": site, "cost_center": cost_center, "team": team}
+    for field in GROUP_FIELDS:
+        value = groups[field]
+        if value and value.strip():
+            userlist[new_id][field] = value.strip()
     save_userlist(userlist)
 
     return f"Nutzer {first_name} {last_name} mit ID {new_id} wurde angelegt."
 
 def update_user(user_id: str, first_name: str = None, last_name: str = None,
-                nfc_code: str = None, password: str = None, role: str = None) -> str:
-    """Aktualisiert Felder eines bestehenden Nutzers (nur übergebene Felder)."""
+                nfc_code: str = None, password: str = None, role: str = None,
+                team: str = None, cost_center: str = None, site: str = None) -> str:
+    """
+    Aktualisiert Felder eines bestehenden Nutzers (nur übergebene Felder).
+    Ein leerer Wert bei team / cost_center / site entfernt die Zuordnung.
+    """
     userlist = load_userlist()
     if user_id not in userlist:
         return f"Unbekannte User-ID {user_id}"
@@ -45,6 +58,15 @@ def update_user(user_id: str, first_name: str = None, last_name: str = None,
         userlist[user_id]["password"] = password
     if role is not None:
         userlist[user_id]["role"] = role
+    groups = {"site": site, "cost_center": cost_center, "team": team}
+    for field in GROUP_FIELDS:
+        value = groups[field]
+        if value is None:
+            continue
+        if value.strip():
+            userlist[user_id][field] = value.strip()
+        else:
+            userlist[user_id].pop(field, None)
 
     save_userlist(userlist)
     return f"Nutzerdaten für ID {user_id} wurden aktualisiert."
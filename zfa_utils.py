@@ -1,35 +1,118 @@
 import os
 import json
+import time
+import gzip
+import mmap
+import struct
+import threading
+import contextvars
+from contextlib import contextmanager
+
+try:
+    import fcntl  # nur unter Linux/Unix (Raspberry Pi, Server)
+except ImportError:
+    fcntl = None
+from datetime import datetime
+
+# ==========================================================
+# Lesebasis (aktueller Datenbestand oder Snapshot, siehe snapshot.py)
+# ==========================================================
+_read_root = contextvars.ContextVar("zfa_read_root", default="")
+
+
+def set_read_root(root: str):
+    """
+    Lässt Lesefunktionen (userlist, Timestamps, Archive) im aktuellen Thread
+    bzw. Kontext aus root statt aus dem Arbeitsverzeichnis lesen.
+    Gibt ein Token für reset_read_root() zurück. Schreibzugriffe sind nicht betroffen.
+    """
+    return _read_root.set(root)
+
+
+def reset_read_root(token) -> None:
+    """Stellt die vorherige Lesebasis wieder her."""
+    _read_root.reset(token)
+
+
+def read_path(path: str) -> str:
+    """Pfad zum Lesen unter Berücksichtigung eines aktiven Snapshots."""
+    root = _read_root.get()
+    if root and not os.path.isabs(path):
+        return os.path.join(root, path)
+    return path
+
 
 # ==========================================================
 # Basisfunktionen für Benutzer- und Zeitdaten
 # ==========================================================
 def load_userlist() -> dict:
     """Lädt die userlist.txt und gibt sie als Dictionary zurück."""
-    if not os.path.exists("userlist.txt"):
+    path = read_path("userlist.txt")
+    if not os.path.exists(path):
         return {}
-    with open("userlist.txt", "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
 def save_userlist(userlist: dict) -> None:
     """Speichert die userlist.txt."""
-    with open("userlist.txt", "w", encoding="utf-8") as f:
-        json.dump(userlist, f, indent=4, ensure_ascii=False)
+    write_json_atomic("userlist.txt", userlist)
+    bump_data_version("userlist")
 
 
 def load_timestamps(path: str) -> list:
     """Lädt eine Timestamp-Datei eines Nutzers (falls vorhanden)."""
+    path = read_path(path)
     if not os.path.exists(path):
         return []
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+def write_json_atomic(path: str, data) -> None:
+    """
+    Schreibt JSON erst in eine temporäre Datei und ersetzt dann das Ziel,
+    damit Leser nie eine halb geschriebene Datei sehen.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    """
+    Exklusive Sperre über eine Lock-Datei (prozess- und threadübergreifend),
+    für Lesen-Ändern-Schreiben-Abläufe auf gemeinsam genutzten Dateien.
+    """
+    with open(lock_path, "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def timestamps_lock(path: str):
+    """
+    Sperre für Lesen-Ändern-Schreiben einer Timestamp-Datei. Alle Schreiber
+    (clock(), Archivierung, Reparatur, Import) halten sie vom Laden bis zum
+    Speichern, damit keine Buchung durch einen parallelen Schreiber verloren geht.
+    Reine Leser brauchen sie nicht (Dateien werden atomar ersetzt).
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    return file_lock(f"{path}.lock")
+
+
 def save_timestamps(path: str, timestamps: list) -> None:
     """Speichert eine Timestamp-Datei eines Nutzers."""
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(timestamps, f, indent=4, ensure_ascii=False)
+    write_json_atomic(path, timestamps)
+    bump_user_data_version(os.path.dirname(path))
 
 
 def seconds_to_hours_minutes_str(seconds: float) -> str:
@@ -40,6 +123,125 @@ def seconds_to_hours_minutes_str(seconds: float) -> str:
     return f"{hours}h {minutes}m"
 
 
+# ==========================================================
+# Prozessübergreifender Änderungszähler (für mehrere Worker)
+# ==========================================================
+SHARED_VERSION_FILE = "data_version.bin"
+_shared_version_map = None
+_local_cache = {"version": None, "entries": {}}
+
+
+def _shared_version_map_open() -> mmap.mmap:
+    """Öffnet (und legt bei Bedarf an) die 8-Byte-Zählerdatei als Shared Memory."""
+    global _shared_version_map
+    if _shared_version_map is None:
+        fd = os.open(SHARED_VERSION_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.write(fd, b"\0" * 8)
+            _shared_version_map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+    return _shared_version_map
+
+
+def bump_shared_version() -> int:
+    """Erhöht den gemeinsamen Änderungszähler aller Prozesse und liefert den neuen Wert."""
+    shared = _shared_version_map_open()
+    with open(SHARED_VERSION_FILE, "rb") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            version = struct.unpack_from("<Q", shared, 0)[0] + 1
+            struct.pack_into("<Q", shared, 0, version)
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return version
+
+
+def get_shared_version() -> int:
+    """Liest den gemeinsamen Änderungszähler (ein Speicherzugriff, kein Dateisystem)."""
+    return struct.unpack_from("<Q", _shared_version_map_open(), 0)[0]
+
+
+def local_cache(key, loader):
+    """
+    Prozesslokaler Cache für abgeleitete Daten. Sobald irgendein Prozess
+    Daten speichert (bump_shared_version), werden alle Einträge verworfen.
+    """
+    version = get_shared_version()
+    if _local_cache["version"] != version:
+        _local_cache["version"] = version
+        _local_cache["entries"] = {}
+    entries = _local_cache["entries"]
+    if key not in entries:
+        entries[key] = loader()
+    return entries[key]
+
+
+# ==========================================================
+# Datenversionen (für ETags und Seiten-Cache)
+# ==========================================================
+DATA_VERSION_FILE = "data_version.json"
+
+
+def _read_version_file(path: str) -> dict:
+    """Liest eine Versionsdatei; fehlt sie oder ist sie defekt, gilt sie als leer."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def _bump(stamps: dict, key: str) -> None:
+    """Erhöht einen Versionszähler und setzt den Änderungszeitpunkt (ns)."""
+    entry = stamps.get(key, {})
+    stamps[key] = {"version": entry.get("version", 0) + 1, "modified": time.time_ns()}
+
+
+def bump_data_version(scope: str) -> None:
+    """
+    Erhöht die globale Datenversion und die Version des Bereichs
+    ("userlist", "corrections", "timestamps").
+    Wird von allen Schreibfunktionen in diesem Modul aufgerufen.
+    """
+    stamps = _read_version_file(DATA_VERSION_FILE)
+    _bump(stamps, "global")
+    _bump(stamps, scope)
+    write_json_atomic(DATA_VERSION_FILE, stamps)
+    bump_shared_version()  # zuletzt, damit andere Worker die neuen Daten sehen
+
+
+def bump_user_data_version(user_folder: str) -> None:
+    """Erhöht die Datenversion eines Nutzerordners und die globale Version."""
+    folder = os.path.basename(os.path.normpath(user_folder)) if user_folder else ""
+    if folder:
+        path = os.path.join(user_folder, f"{folder}_version.json")
+        stamps = _read_version_file(path)
+        _bump(stamps, "timestamps")
+        write_json_atomic(path, stamps)
+    bump_data_version("timestamps")
+
+
+def get_data_version(scope: str = "global") -> tuple[int, int]:
+    """Liefert (Version, Änderungszeitpunkt in ns) eines Bereichs, (0, 0) falls unbekannt."""
+    stamps = local_cache("data_version", lambda: _read_version_file(DATA_VERSION_FILE))
+    entry = stamps.get(scope, {})
+    return entry.get("version", 0), entry.get("modified", 0)
+
+
+def get_user_data_version(user_folder: str) -> tuple[int, int]:
+    """Liefert (Version, Änderungszeitpunkt in ns) der Zeitdaten eines Nutzerordners."""
+    path = os.path.join(user_folder, f"{user_folder}_version.json")
+    stamps = local_cache(("user_version", user_folder), lambda: _read_version_file(path))
+    entry = stamps.get("timestamps", {})
+    return entry.get("version", 0), entry.get("modified", 0)
+
+
 # ==========================================================
 # Flag-System für automatische Korrekturen
 # ==========================================================
@@ -50,6 +252,7 @@ def set_pending_corrections_flag(state: bool):
     """Setzt das Flag, ob neue automatische Buchungen vorhanden sind."""
     with open(PENDING_CORRECTIONS_FILE, "w", encoding="utf-8") as f:
         json.dump({"new_pending_corrections": state}, f, indent=4, ensure_ascii=False)
+    bump_data_version("corrections")
 
 
 def get_pending_corrections_flag() -> bool:
@@ -62,3 +265,200 @@ def get_pending_corrections_flag() -> bool:
             return data.get("new_pending_corrections", False)
     except json.JSONDecodeError:
         return False
+
+
+# ==========================================================
+# Änderungsverfolgung für inkrementelle Exporte
+# ==========================================================
+DIRTY_MONTHS_FILE = "dirty_months.json"
+DIRTY_MONTHS_LOCK = "dirty_months.lock"
+
+
+def load_dirty_months() -> dict:
+    """
+    Liest die seit dem letzten Export geänderten (Monat, Nutzer)-Paare.
+
+    Rückgabeformat: {"2025-10": ["1", "2"], "2025-09": ["3"]}
+    """
+    if not os.path.exists(DIRTY_MONTHS_FILE):
+        return {}
+    try:
+        with open(DIRTY_MONTHS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+
+def save_dirty_months(dirty: dict) -> None:
+    """Speichert die Liste der geänderten (Monat, Nutzer)-Paare."""
+    write_json_atomic(DIRTY_MONTHS_FILE, dirty)
+
+
+def mark_dirty(user_id: str, time_str: str) -> None:
+    """
+    Merkt den Monat eines neuen oder korrigierten Eintrags (Format
+    "YYYY-MM-DD ..." oder "YYYY-MM-DD") für den nächsten Export vor.
+    Muss von jedem Schreibpfad (clock(), Korrekturen) aufgerufen werden.
+    """
+    mark_dirty_many({user_id: [time_str[:7]]})
+
+
+def mark_dirty_many(changes: dict) -> None:
+    """
+    Wie mark_dirty(), aber für viele Nutzer und Monate auf einmal
+    ({"1": ["2025-09", "2025-10"], ...}), mit nur einem Schreibvorgang.
+    """
+    # Korrekturen in abgeschlossenen Monaten machen Saldo-Checkpoints ungültig
+    current_month = datetime.now().strftime("%Y-%m")
+    past = {uid: min(months) for uid, months in changes.items() if months and min(months) < current_month}
+    if past:
+        userlist = load_userlist()
+        for user_id, month_key in past.items():
+            user = userlist.get(user_id)
+            if user:
+                invalidate_balance_checkpoints(user["folder"], month_key)
+
+    # Sperre über Lesen und Schreiben: Buchungen verschiedener Nutzer laufen parallel
+    with file_lock(DIRTY_MONTHS_LOCK):
+        dirty = load_dirty_months()
+        changed = False
+        for user_id, months in changes.items():
+            for month_key in months:
+                users = dirty.setdefault(month_key, [])
+                if user_id not in users:
+                    users.append(user_id)
+                    changed = True
+        if changed:
+            save_dirty_months(dirty)
+
+
+def clear_dirty_months(done: dict) -> None:
+    """
+    Entfernt exportierte (Monat, Nutzer)-Paare. Änderungen, die während
+    des Exports hinzugekommen sind, bleiben erhalten.
+    """
+    with file_lock(DIRTY_MONTHS_LOCK):
+        dirty = load_dirty_months()
+        for month_key, user_ids in done.items():
+            remaining = [uid for uid in dirty.get(month_key, []) if uid not in user_ids]
+            if remaining:
+                dirty[month_key] = remaining
+            else:
+                dirty.pop(month_key, None)
+        save_dirty_months(dirty)
+
+
+# ==========================================================
+# Gleitzeit-Checkpoints (abgeschlossene Monate)
+# ==========================================================
+def balance_path(user_folder: str) -> str:
+    """Pfad der Checkpoint-Datei für das Gleitzeitkonto eines Nutzers."""
+    return os.path.join(user_folder, f"{user_folder}_balance.json")
+
+
+def load_balance_checkpoints(user_folder: str) -> dict:
+    """
+    Lädt die Monats-Checkpoints eines Nutzers.
+
+    Rückgabeformat:
+    {"start_date": "2025-09-03",
+     "months": {"2025-09": {"worked": 90000, "target": 97200, "carry": -7200}}}
+    (Sekunden; "carry" = Saldo am Monatsende)
+    """
+    path = balance_path(user_folder)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+
+def save_balance_checkpoints(user_folder: str, checkpoints: dict) -> None:
+    """Speichert die Monats-Checkpoints eines Nutzers."""
+    write_json_atomic(balance_path(user_folder), checkpoints)
+
+
+def balance_lock(user_folder: str):
+    """
+    Sperre für Lesen-Ändern-Schreiben der Checkpoints eines Nutzers
+    (Nachberechnen in get_flexitime_balance() und Invalidierung).
+    """
+    os.makedirs(user_folder, exist_ok=True)
+    return file_lock(f"{balance_path(user_folder)}.lock")
+
+
+def invalidate_balance_checkpoints(user_folder: str, month_key: str) -> None:
+    """Verwirft alle Checkpoints ab dem angegebenen Monat ("YYYY-MM")."""
+    with balance_lock(user_folder):
+        checkpoints = load_balance_checkpoints(user_folder)
+        if not checkpoints:
+            return
+        if month_key < checkpoints.get("start_date", "")[:7]:
+            # Buchung vor dem bisherigen Beginn → alles neu berechnen
+            os.remove(balance_path(user_folder))
+            return
+        months = checkpoints.get("months", {})
+        checkpoints["months"] = {m: cp for m, cp in months.items() if m < month_key}
+        save_balance_checkpoints(user_folder, checkpoints)
+
+
+# ==========================================================
+# Jahresarchive (abgeschlossene Jahre, siehe archive.py)
+# ==========================================================
+def archive_dir(user_folder: str) -> str:
+    """Ordner mit den Jahresarchiven eines Nutzers."""
+    return os.path.join(user_folder, "archive")
+
+
+def archive_events_path(user_folder: str, year: int) -> str:
+    """Komprimierte Buchungen eines Jahres (eine JSON-Zeile pro Eintrag)."""
+    return os.path.join(archive_dir(user_folder), f"{user_folder}_{year}.jsonl.gz")
+
+
+def archive_summary_path(user_folder: str, year: int) -> str:
+    """Jahreszusammenfassung mit Tagessummen."""
+    return os.path.join(archive_dir(user_folder), f"{user_folder}_{year}_summary.json")
+
+
+def archived_years(user_folder: str) -> list[int]:
+    """Alle archivierten Jahre eines Nutzers (aufsteigend)."""
+    folder = read_path(archive_dir(user_folder))
+    if not os.path.isdir(folder):
+        return []
+    prefix, suffix = f"{user_folder}_", "_summary.json"
+    years = []
+    for name in os.listdir(folder):
+        if name.startswith(prefix) and name.endswith(suffix):
+            year = name[len(prefix):-len(suffix)]
+            if year.isdigit():
+                years.append(int(year))
+    return sorted(years)
+
+
+def load_archive_summary(user_folder: str, year: int) -> dict | None:
+    """
+    Lädt die Jahreszusammenfassung (falls archiviert).
+
+    Rückgabeformat:
+    {"year": 2024, "events": 480, "first": "2024-01-02 08:59:12",
+     "last": "2024-12-20 17:01:00", "total_seconds": 1234567,
+     "daily": {"2024-01-02": 28800, ...}}
+    """
+    path = read_path(archive_summary_path(user_folder, year))
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_archived_events(user_folder: str, year: int):
+    """Liest die archivierten Buchungen eines Jahres zeilenweise (ohne alles zu laden)."""
+    path = read_path(archive_events_path(user_folder, year))
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)